@@ -17,8 +17,8 @@
 
 import sys
 import os
+import time
 import argparse
-import base64
 import string
 import logging
 import re
@@ -26,20 +26,22 @@ import re
 from sentence_splitter import SentenceSplitter, SentenceSplitterException
 from loomchild.segmenter import LoomchildSegmenter
 
-from monotextor.utils.common import open_xz_or_gzip_or_plain
 from monotextor.utils.common import ExternalTextProcessor
+from monotextor.utils.b64_docs import open_docs, read_doc_batches, DocWriter
+
+PARAGRAPH_ID_PATTERN = re.compile("^([0-9]+):([0-9]+)$")
+# Removes digits and punctuation: the number of removed characters is the length difference
+DIGITS_AND_PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation + string.digits)
 
 
 # True -> keep sentence
 # False -> throw away
 def filter_trash(sentence):
-    digits_and_punctuation = string.punctuation + string.digits
-    n = 0
-    for c in sentence:
-        if c == "\x00":
-            return False
-        if c in digits_and_punctuation:
-            n = n + 1
+    if "\x00" in sentence:
+        return False
+
+    n = len(sentence) - len(sentence.translate(DIGITS_AND_PUNCTUATION_TABLE))
+
     return n < len(sentence) // 2
 
 
@@ -55,7 +57,7 @@ def split_segments(text, splitter_unary_func, prune_type="words", prune_threshol
     if filter_bad_sentences:
         segments = [s for s in segments if filter_trash(s)]
 
-    segments = [s.strip() for s in segments if s.strip() != '']
+    segments = [s for s in map(str.strip, segments) if s != '']
 
     if return_list:
         return segments
@@ -65,6 +67,68 @@ def split_segments(text, splitter_unary_func, prune_type="words", prune_threshol
     return segmented_text
 
 
+def split_document(doc, doc_idx):
+    # Returns the sentences of a BASE64-decoded document (not encoded yet) as a list of lines
+    sentences = []
+    content = ""
+
+    try:
+        content = doc.decode("utf-8").strip(' \n')
+    except UnicodeDecodeError:
+        logging.error("Unicode decoding error: skipping document #%d", doc_idx)
+
+        # TODO should we try to get the content of the file? We shouldn't write the content directly
+        #  since the previous error for which we skip the sentence splitting can't handle correctly
+        #  the metadata, what might lead to unexpected results in further stages. Furthermore, the
+        #  malformed BASE64 content might lead to further stages to fail as well
+        content = ""
+
+    # Split each sentence of the paragraph and identify each of them with the corresponding paragraph
+    for sent_idx, sentence in enumerate(content.split("\n"), 1):
+        column = sentence.split('\t')
+        paragraph_text = column[0].strip()
+
+        if process_paragraphs and len(column) == 1:
+            sentences.append(f"{paragraph_text}\tp-1s-1\n")
+
+            logging.error("Could not get the paragraph identification data for the doc #%d, sentence #%d: using 'p-1s-1'", doc_idx, sent_idx)
+
+            continue
+
+        sentences_wo_paragraphs = split_segments(paragraph_text, splitter_func, options.prune_type,
+                                                 options.prune_threshold, not options.dont_filter, return_list=True)
+        suffix = ('\t' if len(column) > suffix_offset else '') + '\t'.join(column[suffix_offset:]) + '\n' if propagate_metadata else '\n'
+        paragraph_id = 0
+        total_paragraphs = 0
+
+        if process_paragraphs:
+            m = PARAGRAPH_ID_PATTERN.match(column[1])
+            if m:
+                paragraph_id = int(m.group(1)) # Starts at 1
+                total_paragraphs = int(m.group(2))
+
+                if paragraph_id > total_paragraphs:
+                    logging.warning(f"Paragraph id > total paragraphs (bug?): {paragraph_id} > {total_paragraphs}")
+
+            else:
+                raise Exception(f"Couldn't process document #{doc_idx}, sentence #{sent_idx}")
+
+            nosentences = len(sentences_wo_paragraphs)
+
+            for idx, sentence_wo_paragraph in enumerate(sentences_wo_paragraphs, 1):
+                # Paragraph data
+                sentences.append(f"{sentence_wo_paragraph}\tp{paragraph_id}:{total_paragraphs}s{idx}/{nosentences}{suffix}")
+        else:
+            sentences.extend(f"{sentence_wo_paragraph}{suffix}" for sentence_wo_paragraph in sentences_wo_paragraphs)
+
+    return sentences
+
+
+def split_batch(docs, first_doc_idx):
+    # Split documents of the batch, which are written at once
+    return [''.join(split_document(doc, doc_idx)).encode("utf-8") for doc_idx, doc in enumerate(docs, first_doc_idx)]
+
+
 oparser = argparse.ArgumentParser(description="Tool that does sentence splitting on plain text")
 oparser.add_argument("--text", default="-",
                      help="Plain text file")
@@ -88,14 +152,36 @@ oparser.add_argument("--process-paragraphs", action="store_true",
 oparser.add_argument("--propagate-metadata", action="store_true",
                      help="All columns, starting from 2nd, will be propagated. If --process-paragraphs is set, columns starting"
                           " from 3rd column will be propagated")
+oparser.add_argument("--persistent-splitter", action="store_true",
+                     help="Custom sentence splitter is executed once and the paragraphs are streamed through its "
+                          "stdin/stdout instead of executing it once per paragraph. The splitter must flush its output "
+                          "after each line")
+oparser.add_argument("--splitter-delimiter", default="<MONOTEXTOR_END_OF_DOCUMENT>",
+                     help="Line written after each paragraph when --persistent-splitter is set. The splitter must "
+                          "return it as it is (e.g. a line which can't be split)")
+oparser.add_argument("--splitter-timeout", type=float, default=300,
+                     help="Seconds the splitter has to return each line when --persistent-splitter is set. Otherwise, "
+                          "it is killed and started again")
+oparser.add_argument("--batch-size", type=int, default=1000,
+                     help="Number of documents which are processed and written at once")
+oparser.add_argument("--verbose", action="store_true",
+                     help="Report the throughput (documents per second) through stderr")
 
 options = oparser.parse_args()
 
+if not options.splitter_delimiter:
+    # Splitters return more lines than they receive, so the paragraphs can't be found without the delimiter
+    oparser.error("--splitter-delimiter can't be empty")
+
+logging.basicConfig(level=logging.INFO if options.verbose else logging.WARNING)
+
 splitter = options.splitter
 process_paragraphs = options.process_paragraphs
 propagate_metadata = options.propagate_metadata
+suffix_offset = 2 if process_paragraphs else 1
 
 splitter_func = lambda s: s.split('\n')
+external_splitter = None
 
 # Get splitter
 if not splitter or splitter == "loomchild":
@@ -116,69 +202,31 @@ elif splitter == "none":
     pass
 
 # TODO check TODO in bitextor_tokenize.py about ExternalTextProcessor and ToolWrapper
-# use custom sentence splitter via ExternalTextProcessor (inefficient):
+# use custom sentence splitter via ExternalTextProcessor (inefficient unless --persistent-splitter is set):
 else:
-    splitter_func = ExternalTextProcessor(os.path.expanduser(splitter)).process
-
-with open_xz_or_gzip_or_plain(options.text) if options.text != "-" else sys.stdin as reader, \
-     open(options.sent_output, 'w') if options.sent_output != "-" else sys.stdout as writer:
-    for doc_idx, doc in enumerate(reader, 1):
-        sentences = ""
-        content = ""
-        doc = doc.strip()
-        skip = False
-
-        try:
-            content = base64.b64decode(doc).decode("utf-8").strip(' \n')
-        except UnicodeDecodeError:
-            logging.error("Unicode decoding error: skipping document #%d", doc_idx)
-
-            skip = True
-
-        if skip:
-            # TODO should we try to get the content of the file? We shouldn't write the content directly
-            #  since the previous error for which we skip the sentence splitting can't handle correctly
-            #  the metadata, what might lead to unexpected results in further stages. Furthermore, the
-            #  malformed BASE64 content might lead to further stages to fail as well
-            content = ""
-
-        content = content.split("\n")
-
-        # Split each sentence of the paragraph and identify each of them with the corresponding paragraph
-        for sent_idx, sentence in enumerate(content, 1):
-            column = sentence.split('\t')
-            paragraph_text = column[0].strip()
-
-            if process_paragraphs and len(column) == 1:
-                sentences += f"{paragraph_text}\tp-1s-1\n"
-
-                logging.error("Could not get the paragraph identification data for the doc #%d, sentence #%d: using 'p-1s-1'", doc_idx, sent_idx)
+    external_splitter = ExternalTextProcessor(os.path.expanduser(splitter), persistent=options.persistent_splitter,
+                                              delimiter=options.splitter_delimiter,
+                                              timeout=options.splitter_timeout)
+    # the splitter returns a sentence per line
+    splitter_func = lambda s: external_splitter.process(s).split('\n')
 
-                continue
+start_time = time.time()
+nodocs = 0
 
-            sentences_wo_paragraphs = split_segments(paragraph_text, splitter_func, options.prune_type,
-                                                        options.prune_threshold, not options.dont_filter, return_list=True)
-            suffix_offset = 2 if process_paragraphs else 1
-            suffix = ('\t' if len(column) > suffix_offset else '') + '\t'.join(column[suffix_offset:]) + '\n' if propagate_metadata else '\n'
-            paragraph_id = 0
-            total_paragraphs = 0
-            if process_paragraphs:
-                pattern = re.compile("^([0-9]+):([0-9]+)$")
-                m = re.match(pattern, column[1])
-                if m:
-                    paragraph_id = int(m.group(1)) # Starts at 1
-                    total_paragraphs = int(m.group(2))
+with open_docs(options.text) as reader, \
+     open(options.sent_output, 'wb') if options.sent_output != "-" else sys.stdout.buffer as output, \
+     DocWriter(output) as writer:
+    for batch in read_doc_batches(reader, options.batch_size):
+        writer.write_batch(split_batch(batch, nodocs + 1))
 
-                    if paragraph_id > total_paragraphs:
-                        logging.warning(f"Paragraph id > total paragraphs (bug?): {paragraph_id} > {total_paragraphs}")
+        nodocs += len(batch)
 
-                else:
-                    raise Exception(f"Couldn't process document #{doc_idx}, sentence #{sent_idx}")
+        logging.info("%d documents processed (%.2f docs/s)", nodocs, nodocs / max(time.time() - start_time, 1e-6))
 
-            for idx in range(len(sentences_wo_paragraphs)):
-                infix = f"\tp{paragraph_id}:{total_paragraphs}s{idx + 1}/{len(sentences_wo_paragraphs)}" if process_paragraphs else '' # Paragraph data
-                sentences += f"{sentences_wo_paragraphs[idx]}{infix}{suffix}"
+if external_splitter is not None:
+    external_splitter.close()
 
-        sentences = base64.b64encode(sentences.encode("utf-8")).decode("utf-8")
+elapsed_time = time.time() - start_time
 
-        writer.write(f"{sentences}\n")
+logging.info("%d documents processed in %.2f seconds (%.2f docs/s)", nodocs, elapsed_time,
+             nodocs / max(elapsed_time, 1e-6))
@@ -16,38 +16,67 @@
 #  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
 
 from warcio.archiveiterator import ArchiveIterator
-from warcio.warcwriter import WARCWriter
+from warcio.warcwriter import WARCWriter, GzippingWrapper
 from warcio.statusandheaders import StatusAndHeaders
 import sys
 import argparse
-import cchardet
 import re
+import signal
 import logging
+import zlib
 import lzma
-import subprocess
-import zipfile
-import io
+from collections import deque
 from io import BytesIO
 
+from monotextor.utils.encoding import DETECT_SIZE, EncodingResolver
 
-def convert_encoding(data):
-    encoding = cchardet.detect(data)['encoding']
-    decoded = ''
-    # if detected encoding fails (or is None), try some common encodings
-    for enc in [encoding, 'utf-8', 'iso-8859-1', 'windows‑1252']:
-        try:
-            decoded = data.decode(encoding)
-            return enc, decoded
-        except BaseException:
-            pass
-    return None, ''
+RAW_COPY_BLOCK_SIZE = 1 << 20
+
+
+class LevelWARCWriter(WARCWriter):
+    # WARCWriter whose gzip compression level can be set (warcio always uses 9, which is slow)
+
+    def __init__(self, filebuf, gzip=True, compression_level=9, *args, **kwargs):
+        # The records are compressed here instead of by warcio
+        super().__init__(filebuf, *args, gzip=False, **kwargs)
+        self.compress = gzip
+        self.compression_level = compression_level
+
+    def _write_warc_record(self, out, record):
+        if self.compress:
+            out = LevelGzippingWrapper(out, self.compression_level)
+
+        return super()._write_warc_record(out, record)
+
+
+class LevelGzippingWrapper(GzippingWrapper):
+
+    def __init__(self, out, compression_level):
+        super().__init__(out)
+        self.compressor = zlib.compressobj(compression_level, zlib.DEFLATED, zlib.MAX_WBITS + 16)
+
+
+def copy_raw_record(input_fd, offset, length, output_fd):
+    # Bytes of a record of the input WARC, as they are (e.g. a gzip member), in blocks
+    input_fd.seek(offset)
+
+    while length > 0:
+        block = input_fd.read(min(length, RAW_COPY_BLOCK_SIZE))
+
+        if not block:
+            raise Exception(f"unexpected end of the input WARC while copying the record at offset {offset}")
+
+        output_fd.write(block)
+        length -= len(block)
 
 
 def pdf2html(data):
-    pconverter = subprocess.Popen(["pdftohtml", "-i", "-stdout", "-", "-"],
-                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
-    converter_stdout, error = pconverter.communicate(input=data)
-    return [converter_stdout.replace(b"&#160;", b" ")]
+    import subprocess
+
+    # subprocess.run kills pdftohtml if the conversion is interrupted (e.g. by the timeout)
+    pconverter = subprocess.run(["pdftohtml", "-i", "-stdout", "-", "-"], input=data,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return [pconverter.stdout.replace(b"&#160;", b" ")]
 
 
 def pdfextract(data, pdfextractor):
@@ -59,7 +88,9 @@ def pdfextract(data, pdfextractor):
 
 
 def openoffice2html(data):
-    datastream = io.BytesIO(data)
+    import zipfile
+
+    datastream = BytesIO(data)
     try:
         openoffice_file = zipfile.ZipFile(datastream)
         return [openoffice_file.read('content.xml')]
@@ -68,7 +99,9 @@ def openoffice2html(data):
 
 
 def office2html(data):
-    datastream = io.BytesIO(data)
+    import zipfile
+
+    datastream = BytesIO(data)
     try:
         office_file = zipfile.ZipFile(datastream)
         # word/document.xml, ppt/slides/slide*.xml, xl/sharedStrings.xml
@@ -85,7 +118,9 @@ def office2html(data):
 
 
 def epub2html(data):
-    datastream = io.BytesIO(data)
+    import zipfile
+
+    datastream = BytesIO(data)
     try:
         epub_file = zipfile.ZipFile(datastream)
         # EPUB/*html
@@ -101,6 +136,215 @@ def epub2html(data):
         return []
 
 
+class ConversionTimeout(BaseException):
+    # Not an Exception, so the converters which ignore their own errors don't ignore the timeout
+    pass
+
+
+def raise_conversion_timeout(signum, frame):
+    raise ConversionTimeout()
+
+
+def convert(task):
+    # Conversion of a broader document format into (X)HTML payloads. It runs in a worker process (or in the main
+    #  process if --conversion-workers is 0) with a timeout
+    url, converter, data = task
+
+    if options.conversion_timeout > 0:
+        signal.signal(signal.SIGALRM, raise_conversion_timeout)
+        signal.setitimer(signal.ITIMER_REAL, options.conversion_timeout)
+
+    try:
+        if converter == "pdf":
+            if options.pdfextract:
+                return pdfextract(data, extractor)
+            return pdf2html(data)
+        if converter == "openoffice":
+            return openoffice2html(data)
+        if converter == "office":
+            return office2html(data)
+        return epub2html(data)
+    except ConversionTimeout:
+        logging.info("Skipping " + url + ": conversion timed out after " + str(options.conversion_timeout) + "s")
+        return []
+    except MemoryError:
+        logging.info("Skipping " + url + ": conversion exceeded the memory limit")
+        return []
+    finally:
+        if options.conversion_timeout > 0:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def init_pdfextract():
+    global extractor
+
+    from pdfextract.extract import Extractor as ExtrP
+    extractor = ExtrP(
+        configFile=options.configFile,
+        sentenceJoinPath=options.sentenceJoinPath,
+        kenlmPath=options.kenlmPath)
+
+
+def init_worker():
+    # The limit is inherited by the converters started by the worker (pdftohtml). It is not set with PDFExtract:
+    #  the JVM reserves more address space than it uses
+    if options.conversion_memory_limit > 0 and not options.pdfextract:
+        import resource
+
+        limit = options.conversion_memory_limit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    # The JVM can't be shared by forked processes, so each worker starts its own
+    if options.pdfextract and not options.pdfpass:
+        init_pdfextract()
+
+
+def write_payloads(url, record_type, warc_content_type, http_headers, bdf, payloads):
+    # The charset of the record, if any, is the one of the original document
+    content_type = http_headers.get_header('Content-Type') if http_headers else None
+
+    for payload in payloads:
+        if not payload:
+            continue
+
+        logging.info("Processing document: " + url)
+        # We convert into UTF8 first of all
+        orig_encoding, encoding_source, text = encoding_resolver.resolve(payload, content_type)
+
+        if orig_encoding is None:
+            logging.info("Encoding of document " + url + " could not be identified")
+            continue
+
+        encoding_resolver.add(orig_encoding, encoding_source)
+
+        text = re.sub('encoding *= *"[^"]+"', '', text, flags=re.IGNORECASE)
+        # Without copying the text as strip() would do
+        if not text or text.isspace():
+            continue
+
+        # The same variable is rebound at each step, so only two copies of the document are alive at a time
+        try:
+            if options.cleanhtml:
+                # HTML is then normalized
+                logging.info(url + ": cleaning HTML")
+                text = cleaner.clean_html(text)
+
+            if options.ftfy:
+                text = ftfy.fix_text(text, unescape_html=False, fix_character_width=False)
+
+        except Exception as ex:
+            logging.info("Skipping " + url + ": " + str(ex))
+            continue
+        text = text.replace("&#160;", " ")
+        text = text.replace("\t", " ")
+        clean_tree = text.encode('utf-8')
+        text = None
+        if http_headers:
+            http_headers.replace_header('Content-Length', str(len(clean_tree)))
+            http_headers.replace_header('Content-Type', 'text/html')
+        elif not http_headers and bdf:
+            # for broader document formats without HTTP header create a fake one
+            # to make it easier to distinguish between binary and processed documents downstream (warc2text)
+            record_type = 'response'
+            http_headers = StatusAndHeaders(
+                statusline="200 OK",
+                protocol="HTTP/1.1",
+                headers=[('Content-Type', 'text/html'), ('Content-Length', str(len(clean_tree)))]
+            )
+
+        new_record = fo.create_warc_record(
+            uri=url,
+            record_type=record_type,
+            warc_content_type=warc_content_type,
+            payload=BytesIO(clean_tree),
+            http_headers=http_headers)
+        fo.write_record(new_record)
+
+
+# Routing of the records, decided from the headers alone (before the payload is read)
+CONVERT, HTML, PASS = "convert", "html", "pdfpass"
+SKIPPED_CONTENT_TYPES_RE = re.compile(
+    "image/|audio/|video/|text/x-component|text/x-js|text/javascript|application/x-javascript|text/css"
+    "|application/javascript|application/x-shockwave-flash|application/octet-stream|application/x-font-ttf")
+SKIPPED_EXTENSIONS = (".gif", ".jpg", ".jpeg", ".png", ".css", ".js", ".mp3", ".mp4", ".ogg", ".midi", ".swf",
+                      "/robots.txt")
+CONVERTERS_BY_EXTENSION = {
+    ".pdf": "pdf",
+    ".odt": "openoffice", ".ods": "openoffice", ".odp": "openoffice",
+    ".docx": "office", ".pptx": "office", ".xlsx": "office",
+    ".epub": "epub",
+}
+
+
+def route_record(record):
+    # (decision, url, converter): the decision is CONVERT, HTML, PASS or the reason why the record is skipped
+    if record.rec_type != 'response' and record.rec_type != 'resource':
+        return "skip:record type", None, None
+
+    url = record.rec_headers.get_header('WARC-Target-URI')
+
+    if url and url[0] == '<' and url[-1] == '>':
+        url = url[1:-1]
+    if url == "unknown" or not url:
+        logging.info("Skipping page with unknown URL")
+        return "skip:unknown URL", None, None
+
+    warc_content_type = record.rec_headers.get_header('Content-Type')
+
+    if warc_content_type is None or "text/dns" in warc_content_type:
+        return "skip:WARC content type", url, None
+
+    pageSize = int(record.rec_headers.get_header('Content-Length'))
+    if options.max_size and pageSize > options.max_size:
+        logging.info("Skipping page, over limit. " + str(pageSize) + " " + url)
+        return "skip:size", url, None
+
+    content_type = record.http_headers.get_header('Content-Type') if record.http_headers is not None else None
+
+    if content_type is not None and SKIPPED_CONTENT_TYPES_RE.search(content_type):
+        return "skip:content type", url, None
+
+    url = url.replace('\t', ' ')
+
+    # Ignore media, scripts, styles and robots.txt
+    if url.endswith(SKIPPED_EXTENSIONS):
+        return "skip:URL extension", url, None
+
+    if content_type is not None and "application/pdf" in content_type:
+        converter = "pdf"
+    else:
+        converter = CONVERTERS_BY_EXTENSION.get(url[-4:]) or CONVERTERS_BY_EXTENSION.get(url[-5:])
+
+    if converter == "pdf" and options.pdfpass:
+        return PASS, url, converter
+    if converter is not None:
+        return CONVERT, url, converter
+    if options.onlybroader:
+        return "skip:not broader document format", url, None
+
+    return HTML, url, None
+
+
+def is_ready(payloads):
+    return isinstance(payloads, list) or payloads.ready()
+
+
+def get_result(entry):
+    *record_info, payloads = entry
+    url = record_info[0]
+
+    if not isinstance(payloads, list):
+        try:
+            # The timeout of the worker should be enough, unless it is stuck out of the interpreter
+            payloads = payloads.get(timeout=options.conversion_timeout * 2 + 10
+                                    if options.conversion_timeout > 0 else None)
+        except multiprocessing.TimeoutError:
+            logging.error("Skipping " + url + ": conversion did not finish")
+            payloads = []
+
+    return (*record_info, payloads)
+
+
 oparser = argparse.ArgumentParser(
     description="Script that takes every record in a WARC file and runs basic preprocessing, which includes: HTML"
                 "normalization, deduplication. The result is a WARC file.")
@@ -126,6 +370,31 @@ oparser.add_argument('--disable-output-gzip', dest='disable_output_gzip', action
                      help='Disable compression of output WARC')
 oparser.add_argument('--disable-pdfs-gzip', dest='disable_pdfs_gzip', action='store_true',
                      help='Disable compression of PDFs WARC (if --pdfpass is enabled)')
+oparser.add_argument('--encoding-detection-size', dest='encoding_detection_size', type=int, default=DETECT_SIZE,
+                     help="Number of bytes of the beginning of the document where the encoding is detected if it is "
+                          "not UTF-8 and the charset of the headers and the <meta> tags is missing or wrong")
+oparser.add_argument('--max-size', dest='max_size', type=int, default=5242880,
+                     help='Maximum size (in bytes) of the records: larger records are skipped without reading them '
+                          '(0 for no limit)')
+oparser.add_argument('--conversion-workers', dest='conversion_workers', type=int, default=1,
+                     help='Number of processes which convert PDFs and office documents to HTML, so the rest of the '
+                          'records are not stopped by slow conversions. If 0, documents are converted by the main '
+                          'process, without memory limit')
+oparser.add_argument('--conversion-timeout', dest='conversion_timeout', type=float, default=120,
+                     help='Seconds after which the conversion of a document is cancelled and the document is '
+                          'skipped (0 for no timeout)')
+oparser.add_argument('--conversion-memory-limit', dest='conversion_memory_limit', type=int, default=2048,
+                     help='Maximum virtual memory (in MB) of each conversion process and its converters (0 for no '
+                          'limit). Not applied with --pdfextract')
+oparser.add_argument('--reorder-buffer-size', dest='reorder_buffer_size', type=int, default=256,
+                     help='Maximum number of records which wait for a conversion to be written in order')
+oparser.add_argument('--pdfpass-raw', dest='pdfpass_raw', action='store_true',
+                     help='Copy the PDF records to the --pdfpass file as they are in the input WARC, without '
+                          'decompressing and compressing them again (their headers are not normalized). Only for '
+                          'input WARC files (not stdin) whose compression (gzip or none) is the same as the PDFs WARC')
+oparser.add_argument('--compression-level', dest='compression_level', type=int, default=9,
+                     choices=range(1, 10),
+                     help='gzip compression level of the output WARC files (1 is the fastest, 9 the smallest)')
 options = oparser.parse_args()
 
 logging.basicConfig(
@@ -148,26 +417,46 @@ else:
     f = ArchiveIterator(open(options.input, 'rb'))
 
 if options.output == sys.stdout or options.output == '-':
-    fo = WARCWriter(sys.stdout.buffer, gzip=True)
+    fo = LevelWARCWriter(sys.stdout.buffer, gzip=not options.disable_output_gzip,
+                         compression_level=options.compression_level)
 else:
-    fo = WARCWriter(open(options.output, 'wb'), gzip=not options.disable_output_gzip)
+    fo = LevelWARCWriter(open(options.output, 'wb'), gzip=not options.disable_output_gzip,
+                         compression_level=options.compression_level)
+
+# The PDF records are copied from the input WARC as they are if its compression is the same as the output one
+#  (checked for every record): they are neither decompressed nor compressed again
+raw_input = None
+pdf_output = None
 
 if options.pdfpass is not None:
-    po = WARCWriter(open(options.pdfpass, 'wb'), gzip=not options.disable_pdfs_gzip)
+    pdf_output = open(options.pdfpass, 'wb')
+    po = LevelWARCWriter(pdf_output, gzip=not options.disable_pdfs_gzip, compression_level=options.compression_level)
 
-if not options.pdfpass and options.pdfextract:
-    import jpype
-    from pdfextract.extract import Extractor as ExtrP
-    extractor = ExtrP(
-        configFile=options.configFile,
-        sentenceJoinPath=options.sentenceJoinPath,
-        kenlmPath=options.kenlmPath)
+    if options.pdfpass_raw:
+        if options.input == sys.stdin or options.input == '-' or options.input[-3:] == ".xz":
+            logging.info("The PDF records can only be copied from uncompressed or gzip input WARC files: they will "
+                         "be written again")
+        else:
+            raw_input = open(options.input, 'rb')
+
+pool = None
+pending = deque()
+route_counts = {}
+encoding_resolver = EncodingResolver(detect_size=options.encoding_detection_size)
 
+if options.conversion_workers == 0 and not options.pdfpass and options.pdfextract:
+    init_pdfextract()
+
+# The libraries of the converters and fixers are imported only if they are needed (this script is started once
+#  per WARC)
 cleaner = None
 if options.cleanhtml:
     from lxml.html.clean import Cleaner
     cleaner = Cleaner(style=True, links=True, add_nofollow=True, page_structure=False, safe_attrs_only=False)
 
+if options.ftfy:
+    import ftfy
+
 if options.output == sys.stdout or options.output == '-':
     filename = ""
 else:
@@ -181,53 +470,31 @@ fo.write_record(
             'format': 'WARC File Format 1.0'}))
 
 for record in f:
-    # Initial checks
-    if record.rec_type != 'response' and record.rec_type != 'resource':
-        continue
-    if not record.rec_headers.get_header('WARC-Target-URI'):
-        url = None
-    elif record.rec_headers.get_header('WARC-Target-URI')[0] == '<' and record.rec_headers.get_header('WARC-Target-URI')[-1] == '>':
-        url = record.rec_headers.get_header('WARC-Target-URI')[1:-1]
-    else:
-        url = record.rec_headers.get_header('WARC-Target-URI')
-    if url == "unknown" or not url:
-        logging.info("Skipping page with unknown URL")
-        continue
-    if record.rec_headers.get_header('Content-Type') is None:
-        continue
-    if "text/dns" in record.rec_headers.get_header('Content-Type'):
-        continue
-    pageSize = int(record.rec_headers.get_header('Content-Length'))
-    if pageSize > 5242880:
-        logging.info("Skipping page, over limit. " + str(pageSize) + " " + url)
-        continue
-    if record.http_headers is not None and record.http_headers.get_header('Content-Type') is not None:
-        if "image/" in record.http_headers.get_header('Content-Type') \
-                or "audio/" in record.http_headers.get_header('Content-Type') \
-                or "video/" in record.http_headers.get_header('Content-Type') \
-                or "text/x-component" in record.http_headers.get_header('Content-Type') \
-                or "text/x-js" in record.http_headers.get_header('Content-Type') \
-                or "text/javascript" in record.http_headers.get_header('Content-Type') \
-                or "application/x-javascript" in record.http_headers.get_header('Content-Type') \
-                or "text/css" in record.http_headers.get_header('Content-Type') \
-                or "application/javascript" in record.http_headers.get_header('Content-Type') \
-                or "application/x-shockwave-flash" in record.http_headers.get_header('Content-Type') \
-                or "application/octet-stream" in record.http_headers.get_header('Content-Type') \
-                or "application/x-font-ttf" in record.http_headers.get_header('Content-Type'):
-            continue
+    decision, url, converter = route_record(record)
+    route_counts[decision] = route_counts.get(decision, 0) + 1
 
-    url = url.replace('\t', ' ')
-    if url[-4:] == ".gif" or url[-4:] == ".jpg" or url[-5:] == ".jpeg" or url[-4:] == ".png" \
-            or url[-4:] == ".css" or url[-3:] == ".js" or url[-4:] == ".mp3" or url[-4:] == ".mp4" \
-            or url[-4:] == ".ogg" or url[-5:] == ".midi" or url[-4:] == ".swf":
+    if decision not in (CONVERT, HTML, PASS):
         continue
 
-    # Ignore robots.txt when processing records
-    if url[-11:] == "/robots.txt":
+    if decision == PASS and raw_input is not None and bool(f.reader.decompressor) == po.compress:
+        # The record is read to the end by the iterator to know its length
+        copy_raw_record(raw_input, f.get_record_offset(), f.get_record_length(), pdf_output)
+
+        if not po.compress:
+            # Not included in the length of uncompressed records
+            pdf_output.write(b'\r\n\r\n')
+
         continue
 
-    payload = record.content_stream().read()
-    payloads = []
+    if options.max_size:
+        # The payload might be larger than the record if it has a Content-Encoding
+        payload = record.content_stream().read(options.max_size + 1)
+
+        if len(payload) > options.max_size:
+            logging.info("Skipping page, over limit after decoding. " + url)
+            continue
+    else:
+        payload = record.content_stream().read()
 
     if not record.http_headers or record.http_headers.to_str()[:7] != "HTTP/1.":
         if record.http_headers:
@@ -246,95 +513,51 @@ for record in f:
             # content length and content type will be filled before writing
             http_headers = StatusAndHeaders(record.http_headers.get_statuscode(), [])
 
-    bdf = True
+    # Broader document format
+    bdf = decision != HTML
+
+    if decision == PASS:
+        new_record = po.create_warc_record(
+            uri=url,
+            record_type=record_type,
+            warc_content_type=record.content_type,
+            payload=BytesIO(payload),
+            http_headers=http_headers)
+        po.write_record(new_record)
+        continue  # do not process further!
+    elif decision == HTML:
+        payloads = [payload]
     # Extract payloads (XML) from non-HTML document formats
-    if url[-4:] == ".pdf" \
-            or ((record.http_headers is not None and record.http_headers.get_header('Content-Type') is not None)
-                and "application/pdf" in record.http_headers.get_header('Content-Type')
-                ):
-        if options.pdfpass:
-            new_record = po.create_warc_record(
-                uri=url,
-                record_type=record_type,
-                warc_content_type=record.content_type,
-                payload=BytesIO(payload),
-                http_headers=http_headers)
-            po.write_record(new_record)
-            continue  # do not process further!
-        if options.pdfextract:
-            payloads = pdfextract(payload, extractor)
-        else:
-            payloads = pdf2html(payload)
-    elif url[-4:] == ".odt" or url[-4:] == ".ods" or url[-4:] == ".odp":
-        payloads = openoffice2html(payload)
-    elif url[-5:] == ".docx" or url[-5:] == ".pptx" or url[-5:] == ".xlsx":
-        payloads = office2html(payload)
-    elif url[-5:] == ".epub":
-        payloads = epub2html(payload)
+    elif options.conversion_workers == 0:
+        payloads = convert((url, converter, payload))
     else:
-        bdf = False
-        if options.onlybroader:
-            payloads = []
-        else:
-            payloads = [payload]
+        if pool is None:
+            # Started with the first document to convert: most WARCs are only HTML
+            import multiprocessing
 
-    date = record.rec_headers.get_header('WARC-Date')
-    recordId = record.rec_headers.get_header('WARC-Record-ID')
-    for payload in payloads:
-        if not payload:
-            continue
+            # The script runs at module level, so the workers are forked: with spawn or forkserver (the default
+            #  in some platforms) each worker would import the script and run it again
+            pool = multiprocessing.get_context("fork").Pool(options.conversion_workers, initializer=init_worker)
 
-        logging.info("Processing document: " + url)
-        # We convert into UTF8 first of all
-        orig_encoding, text = convert_encoding(payload)
+        payloads = pool.apply_async(convert, ((url, converter, payload),))
 
-        if orig_encoding is None:
-            logging.info("Encoding of document " + url + " could not be identified")
-            continue
+    # The records are written in the same order they were read: the records which follow a document that is
+    #  being converted wait in the buffer
+    pending.append((url, record_type, record.content_type, http_headers, bdf, payloads))
 
-        text = re.sub('encoding *= *"[^"]+"', '', text, flags=re.IGNORECASE)
-        if len(text.strip()) == 0:
-            continue
+    while pending and (len(pending) > options.reorder_buffer_size or is_ready(pending[0][-1])):
+        write_payloads(*get_result(pending.popleft()))
 
-        clean_html = ""
-        tree = ""
-        try:
-            if options.cleanhtml:
-                # HTML is then normalized
-                logging.info(url + ": cleaning HTML")
-                clean_html = cleaner.clean_html(text)
-            else:
-                clean_html = text
+while pending:
+    write_payloads(*get_result(pending.popleft()))
 
-            if options.ftfy:
-                import ftfy
-                tree = ftfy.fix_text(clean_html, unescape_html=False, fix_character_width=False)
-            else:
-                tree = clean_html
+for decision in sorted(route_counts):
+    logging.info("Records routed to '" + decision + "': " + str(route_counts[decision]))
 
-        except Exception as ex:
-            logging.info("Skipping " + url + ": " + str(ex))
-            continue
-        clean_tree = tree.replace("&#160;", " ")
-        clean_tree = clean_tree.replace("\t", " ")
-        clean_tree = clean_tree.encode('utf-8')
-        if http_headers:
-            http_headers.replace_header('Content-Length', str(len(clean_tree)))
-            http_headers.replace_header('Content-Type', 'text/html')
-        elif not http_headers and bdf:
-            # for broader document formats without HTTP header create a fake one
-            # to make it easier to distinguish between binary and processed documents downstream (warc2text)
-            record_type = 'response'
-            http_headers = StatusAndHeaders(
-                statusline="200 OK",
-                protocol="HTTP/1.1",
-                headers=[('Content-Type', 'text/html'), ('Content-Length', str(len(clean_tree)))]
-            )
+encoding_resolver.log_counts()
+
+if pool is not None:
+    # Workers which are still stuck in a conversion whose result was abandoned are killed
+    pool.terminate()
+    pool.join()
 
-        new_record = fo.create_warc_record(
-            uri=url,
-            record_type=record_type,
-            warc_content_type=record.content_type,
-            payload=BytesIO(clean_tree),
-            http_headers=http_headers)
-        fo.write_record(new_record)
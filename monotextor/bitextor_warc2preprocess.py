@@ -15,27 +15,24 @@
 #  You should have received a copy of the GNU General Public License
 #  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
 
-import html
 from warcio.archiveiterator import ArchiveIterator
-import base64
 import argparse
-import cchardet
-import magic
 import re
-from bs4 import BeautifulSoup
 import os
-import importlib
+import html
 import logging
 import lzma
 import gzip
-from selectolax.parser import HTMLParser
-from html.parser import HTMLParser as HTMLTokenizer
 import mmh3
 import sys
-import html5lib
-import lxml
-from lxml import etree
-from lxml import html as _lxml_html
+
+from monotextor.utils.common import batched, imap_ordered
+from monotextor.utils.b64_docs import write_text_doc
+from monotextor.utils.boilerplate import REMOVERS, get_remover
+from monotextor.utils.encoding import DETECT_SIZE, EncodingResolver
+from monotextor.utils.html_extraction import EXTRACTORS, get_extractor, normalize_text
+from monotextor.utils.langid import MODELS, LanguageIdentifier
+from monotextor.utils.mime import MimeResolver
 
 
 def remove_control_characters(html):
@@ -81,94 +78,6 @@ def remove_control_characters(html):
 ILLEGAL_XML_CHARS_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1F\uD800-\uDFFF\uFFFE\uFFFF]")
 
 
-class SimpleParser(HTMLTokenizer):
-    startendNL = [
-        "ul",
-        "ol",
-        "dl",
-        "tr",
-        "p",
-        "div",
-        "li",
-        "dd",
-        "dt",
-        "th",
-        "td",
-        "h1",
-        "h2",
-        "h3",
-        "h4",
-        "h5",
-        "h6",
-        "article",
-        "aside",
-        "blockquote",
-        "details",
-        "summary",
-        "figcaption",
-        "footer",
-        "form",
-        "header",
-        "legend",
-        "main",
-        "nav",
-        "pre",
-        "section"]
-    selfNL = ["br", "hr"]
-    noText = ["script", "noscript", "style"]
-    lastTok = ""
-    parsed = ""
-
-    def handle_starttag(self, tag, attrs):
-        if tag in self.startendNL or tag in self.selfNL:
-            self.parsed = self.parsed + "\n"
-        self.lastTok = tag
-
-    def handle_endtag(self, tag):
-        if tag in self.startendNL:
-            self.parsed = self.parsed + "\n"
-        else:
-            self.parsed = self.parsed + " "
-
-    def handle_startendtag(self, tag, attrs):
-        if tag in self.selfNL:
-            self.parsed = self.parsed + "\n"
-
-    def handle_data(self, data):
-        if self.lastTok not in self.noText:
-            newdata = data.replace("\r\n", " ").replace("\n", " ")
-            self.parsed = self.parsed + newdata
-
-    def get_text(self):
-        return self.parsed.strip() + "\n"
-
-
-def guess_lang_from_data2(data):
-    reliable, text_bytes, detected_languages = cld2.detect(
-        ''.join(x for x in data if x.isprintable()), isPlainText=False)
-    return detected_languages[0][1]
-
-
-def guess_lang_from_data3(model, data):
-    language, probability, reliable, proportion = model.get_language(data)
-    return language
-
-
-def convert_encoding(data):
-    encoding = cchardet.detect(data)['encoding']
-    if encoding is None:
-        encoding = "utf-8"
-    if len(data) > 0:
-        # We convert, even if the text is detected to be UTF8 so,
-        # if it is an error and conversion fails, the error is caught here
-        for enc in [encoding, 'utf-8', 'iso-8859-1', 'windows‑1252']:
-            try:
-                return enc, data.decode(enc)
-            except BaseException:
-                pass
-    return None, ''
-
-
 def open_xz_or_gzip(path, mode):
     if path[-3:] == '.gz':
         return gzip.open(path, mode)
@@ -212,6 +121,254 @@ def open_output_files(options, lang, files_dict):
                 "plainTextFile": plainTextFile}
 
 
+def read_records(archive):
+    for record in archive:
+        # Initial checks
+        if record.rec_type != 'response' and record.rec_type != 'resource':
+            continue
+        if record.rec_headers.get_header('WARC-Target-URI')[0] == '<' \
+                and record.rec_headers.get_header('WARC-Target-URI')[-1] == '>':
+            url = record.rec_headers.get_header('WARC-Target-URI')[1:-1]
+        else:
+            url = record.rec_headers.get_header('WARC-Target-URI')
+        if url == "unknown":
+            logging.info("Skipping page with unknown URL")
+            continue
+        url = url.replace('\t', ' ')
+        if url[-4:] == ".gif" or url[-4:] == ".jpg" or url[-5:] == ".jpeg" or url[-4:] == ".png" or url[-4:] == ".css" \
+                or url[-3:] == ".js" or url[-4:] == ".mp3" or url[-4:] == ".mp4" or url[-4:] == ".ogg" \
+                or url[-5:] == ".midi" or url[-4:] == ".swf":
+            continue
+
+        # Ignore robots.txt when processing records
+        if url[-11:] == "/robots.txt":
+            continue
+
+        # The size is checked before reading the payload. The payload might be larger than the record if it has
+        #  a Content-Encoding, so it is read up to the limit
+        if options.max_size:
+            size = record.rec_headers.get_header('Content-Length')
+
+            if size is not None and int(size) > options.max_size:
+                logging.info("Skipping page, over limit. " + size + " " + url)
+                continue
+
+            payload = record.content_stream().read(options.max_size + 1)
+
+            if len(payload) > options.max_size:
+                logging.info("Skipping page, over limit after decoding. " + url)
+                continue
+        else:
+            payload = record.content_stream().read()
+
+        date = record.rec_headers.get_header('WARC-Date')
+        recordId = record.rec_headers.get_header('WARC-Record-ID')
+        # The Content-Type of the resource records is the WARC one
+        if record.http_headers is not None:
+            content_type = record.http_headers.get_header('Content-Type')
+        elif record.rec_type == 'resource':
+            content_type = record.content_type
+        else:
+            content_type = None
+
+        yield url, payload, date, recordId, content_type
+
+
+def prepare_record(record):
+    # Encoding detection, parsing and language identification of a single record (before the boilerplate is
+    #  removed). This and extract_record are the CPU-bound part of the preprocessing and they might run in a
+    #  worker process, so they touch neither the output files nor the deduplication state
+    url, payload, date, recordId, content_type = record
+
+    # We convert into UTF8 first of all
+    orig_encoding, encoding_source, text = encoding_resolver.resolve(payload, content_type)
+    lang = ""
+
+    # Early rejection of the documents in other languages, before the document is parsed
+    if options.langid_prefilter and orig_encoding is not None and language_identifier.is_restrictive():
+        lang = language_identifier.identify(text, is_html=True)
+
+        if lang != "un" and not language_identifier.accepts(lang):
+            logging.info("Language of document " + url + ": " + lang + ". Not among searched languages.")
+            return None
+
+    # Fix HTML issues with html5lib if activated through parameters
+    if options.html5lib or options.parser == "lxml":
+        document = html5lib.parse(remove_control_characters(bytes(text, 'utf8')),
+                                  treebuilder="lxml", namespaceHTMLElements=False)
+        text = etree.tostring(document, encoding="utf8").decode('utf8')
+
+    logging.info("Processing document: " + url)
+    if orig_encoding is None:
+        logging.info("Encoding of document " + url + " could not be identified")
+        return None
+
+    # Without copying the text as strip() would do
+    if not text or text.isspace():
+        return None
+
+    # lang id
+    if options.langid == "cld2":
+        # The result of the prefilter is the same unless the document has been fixed by html5lib
+        if not lang or options.html5lib or options.parser == "lxml":
+            logging.info(url + ": detecting language")
+            lang = language_identifier.identify(text, is_html=True)
+        if not language_identifier.accepts(lang):
+            logging.info("Language of document " + url + ": " + lang + ". Not among searched languages.")
+            return None
+        if lang == "un":
+            logging.info("Language of document " + url + " could not be identified")
+            return None
+
+    return url, date, recordId, content_type, lang, orig_encoding, encoding_source, text
+
+
+def extract_record(prepared, deboiled):
+    # Text extraction of a single record once the boilerplate has been removed (if enabled)
+    url, date, recordId, content_type, lang, orig_encoding, encoding_source, text = prepared
+
+    if deboiled is None:
+        logging.info("Skipping " + url + ": boilerplate could not be removed")
+        return None
+
+    # We compute a hash on the HTML (either normalized one or after boilerpipe if enabled):
+    # if we get duplicate files we discard them
+    html_hash = mmh3.hash(deboiled, signed=False)
+
+    # get the text with the selected engine
+    logging.info(url + ": Getting text with " + options.parser)
+    plaintext = text_extractor.extract(deboiled)
+
+    if plaintext is None:
+        return None
+
+    plaintext = normalize_text(plaintext)
+
+    if options.langid == "cld3":
+        if plaintext:
+            logging.info(url + ": detecting language")
+            lang = language_identifier.identify(plaintext)
+            if not language_identifier.accepts(lang):
+                logging.info("Language of document " + url + ": " + lang + ". Not among searched languages.")
+                return None
+            if lang == "un":
+                logging.info("Language of document " + url + " could not be identified")
+                return None
+        else:
+            return None
+
+    plaintext_hash = mmh3.hash(plaintext, signed=False)
+
+    if len(plaintext) == 0:
+        return None
+
+    # Guessing MIME of the file (checked on original content)
+    logging.info(url + ": Getting mime")
+    mime, mime_source = mime_resolver.resolve(text, content_type)
+
+    if options.paragraph_identification:
+        # Add paragraph index
+        plaintext = [f"{element}\t{idx}" for idx, element in enumerate(plaintext.strip().split("\n"))]
+        plaintext = '\n'.join(plaintext)
+
+    return url, date, recordId, lang, orig_encoding, encoding_source, mime, mime_source, text, deboiled, plaintext, \
+        html_hash, plaintext_hash
+
+
+def process_batch(records):
+    # Each record is released as soon as it is processed. The boilerplate of the documents of the batch is
+    #  removed at once, so the JVM is called once per batch
+    records.reverse()
+    prepared = []
+
+    while records:
+        record = prepare_record(records.pop())
+
+        if record is not None:
+            prepared.append(record)
+
+    if boilerplate_remover is not None:
+        logging.info("Deboiling " + str(len(prepared)) + " documents")
+        deboiled = boilerplate_remover.remove([record[-1] for record in prepared])
+    else:
+        deboiled = [record[-1] for record in prepared]
+
+    prepared.reverse()
+    deboiled.reverse()
+    results = []
+
+    while prepared:
+        results.append(extract_record(prepared.pop(), deboiled.pop()))
+
+    return results
+
+
+def init_worker():
+    global boilerplate_remover
+
+    # The JVM can't be shared by forked processes, so each worker starts its own
+    if options.boilerpipe and options.boilerplate_engine == "boilerpipe":
+        boilerplate_remover = get_remover("boilerpipe", threads=options.boilerpipe_threads)
+    elif options.boilerpipe:
+        boilerplate_remover = get_remover(options.boilerplate_engine)
+
+
+def write_result(result):
+    # The documents of the result are released when the function returns
+    url, date, recordId, lang, orig_encoding, encoding_source, mime, mime_source, text, deboiled, plaintext, \
+        html_hash, plaintext_hash = result
+
+    encoding_resolver.add(orig_encoding, encoding_source)
+    mime_resolver.add(mime_source)
+
+    open_output_files(options, lang, files_dict)
+
+    # checking for duplicate content (duplicates are discarded)
+    if html_hash in seen_html:
+        logging.info("Repeated file:\t" + url)
+        return
+
+    if plaintext_hash in seen_plain_text or plaintext_hash in previous_crawl_hashes \
+            or any(plaintext_hash in index for index in hash_indexes):
+        logging.info("Repeated plain text file:\t" + url)
+        return
+
+    seen_html.add(html_hash)
+    seen_plain_text.add(plaintext_hash)
+
+    if not options.xzlang:
+        files_dict[lang]["mimeFile"].write(mime.encode() + b"\n")
+        files_dict[lang]["urlFile"].write(url.encode() + b"\n")
+        files_dict[lang]["encodingFile"].write(orig_encoding.encode() + b"\n")
+
+        # The documents are encoded in blocks
+        write_text_doc(files_dict[lang]["normHtmlFile"], text)
+
+        if options.boilerpipe:
+            write_text_doc(files_dict[lang]["deboilFile"], deboiled)
+
+        write_text_doc(files_dict[lang]["plainTextFile"], html.unescape(plaintext))
+
+    # append to language specific file
+    else:
+        langfile = lzma.open(options.outDir + "/" + lang, mode="a", format=lzma.FORMAT_XZ)
+        header = "Content-Location: " + url + "\n"
+        header += "Content-Type: " + mime + "\n"
+        header += "Content-Language: " + lang + "\n"
+        header += "Content-Length: " + str(len(plaintext)) + "\n"
+        header += "Date: " + date + "\n"
+        header += "X-WARC-Record-ID: " + recordId + "\n"
+        header += "X-WARC-Filename: " + options.input + "\n"
+        langfile.write(header.encode())
+        langfile.write(b"\n")
+        langfile.write(plaintext.encode())
+        langfile.write(b"\n")
+        langfile.close()
+
+    if options.outputHash:
+        plainTextHashFile.write(str(plaintext_hash).encode() + b"\n")
+
+
 oparser = argparse.ArgumentParser(
     description="Script that takes every record in a WARC file and runs preprocessing, which includes: HTML"
                 "normalization, deduplication, MIME and language identification, and boilerplate removing. The result"
@@ -220,13 +377,26 @@ oparser.add_argument("--verbose", action="store_true", default=False,
                      help="Produce additional information about preprocessing through stderr.")
 oparser.add_argument("--boilerpipe", action="store_true", default=False,
                      help="Use boilerpipe bodytext to do the de-boiling")
-oparser.add_argument("--parser", dest="parser", default="bs4", choices={'bs4', 'modest', 'lxml', 'simple'},
-                     help="Use 'HTML tokenizer', 'modest', 'bs4' or 'lxml' (using html5lib tree) parser to extract relevant text from HTML. By default 'bs4' is used")
+oparser.add_argument("--boilerplate-engine", dest="boilerplate_engine", default="boilerpipe",
+                     choices=list(REMOVERS),
+                     help="Engine which removes the boilerplate with --boilerpipe: 'boilerpipe' (ArticleExtractor, "
+                          "needs a JVM) or 'density' (text and link density of the blocks of the document, in Python)")
+oparser.add_argument("--boilerpipe-threads", dest="boilerpipe_threads", type=int, default=1,
+                     help="Number of Java threads of each process which remove the boilerplate of the documents of "
+                          "a batch (see --workers-batch-size)")
+oparser.add_argument("--parser", dest="parser", default="bs4", choices=list(EXTRACTORS),
+                     help="Use 'HTML tokenizer', 'modest', 'lexbor' (selectolax), 'bs4' or 'lxml' (using html5lib tree) parser to extract relevant text from HTML. By default 'bs4' is used")
 oparser.add_argument("--html5lib", action="store_true", default=False, help="Process HTML tree with html5lib")
 oparser.add_argument('--output-dir', dest='outDir', help='Output directory', required=True)
 oparser.add_argument('--output_hash', dest='outputHash', help='Output path for Murmur Hash of plain texts')
 oparser.add_argument('--input_hash', dest='inputHash',
-                     help='Input path for previous Bitextor Murmur Hash plain texts file')
+                     help='Input path for previous Bitextor Murmur Hash plain texts file. It might be either a file '
+                          'with a hash per line or a hash index (see utils/hash_index.py)')
+oparser.add_argument('--hash-index', dest='hashIndex',
+                     help='Path of a persistent hash index of plain texts: documents whose hash is in the index are '
+                          'discarded, and the hashes of the new documents are added to the index at the end. If it '
+                          'does not exist, it will be created. Indexes from parallel jobs can be merged with '
+                          'utils/hash_index.py')
 oparser.add_argument('--lang1', dest='l1', help='Language l1 in the crawl', default=None)
 oparser.add_argument('--lang2', dest='l2', help='Language l2 in the crawl', default=None)
 oparser.add_argument('--input', dest='input', help='Input WARC file', default=sys.stdin)
@@ -234,11 +404,41 @@ oparser.add_argument('--xzlang', action="store_true", help='Separate output into
                      default=False)
 oparser.add_argument('--langs', dest="langs", default="",
                      help='List of languages to include or ignore (%%): l1,l2,%%l3,%%l4')
-oparser.add_argument('--langid', dest="langid", default="cld2", help="Model used for language detection: cld2 or cld3")
+oparser.add_argument('--langid', dest="langid", default="cld2", choices=MODELS,
+                     help="Model used for language detection: cld2 or cld3")
+oparser.add_argument('--langid-sample-size', dest="langid_sample_size", type=int, default=0,
+                     help="Number of characters of the document used to identify the language (0 for the whole "
+                          "document). Large documents are identified faster, but the language of a document whose "
+                          "sample is not representative might be wrong")
+oparser.add_argument('--langid-sample-spans', dest="langid_sample_spans", type=int, default=1,
+                     help="Number of chunks spread through the document which make up the sample of "
+                          "--langid-sample-size (1 for the beginning of the document)")
+oparser.add_argument('--langid-prefilter', dest="langid_prefilter", action="store_true",
+                     help="Identify the language of the raw HTML right after decoding it, so the documents in other "
+                          "languages than --langs are discarded before they are parsed")
 oparser.add_argument('--compression', dest='compression', default='gz', choices={'xz', 'gz'},
                      help='Compression type for the output files')
 oparser.add_argument('--paragraph-identification', action='store_true',
                      help='Add paragraph index in each b64encoded document sentence as tab separated column')
+oparser.add_argument('--mime-detection', dest='mime_detection', default='headers',
+                     choices=['headers', 'prefix', 'libmagic'],
+                     help="Source of the MIME type of the documents: 'headers' trusts the Content-Type of the record "
+                          "and falls back to 'prefix', which checks the signature of the beginning of the document "
+                          "and falls back to 'libmagic', which checks the whole document (slow). The number of "
+                          "documents resolved by each source is logged with --verbose")
+oparser.add_argument('--encoding-detection-size', dest='encoding_detection_size', type=int, default=DETECT_SIZE,
+                     help="Number of bytes of the beginning of the document where the encoding is detected if it is "
+                          "not UTF-8 and the charset of the headers and the <meta> tags is missing or wrong")
+oparser.add_argument('--max-size', dest='max_size', type=int, default=0,
+                     help='Maximum size (in bytes) of the records: larger records are skipped without reading them '
+                          '(0 for no limit)')
+oparser.add_argument('--workers', type=int, default=1,
+                     help='Number of processes used to process the records. The WARC is read and the output files '
+                          'are written by the main process, so the order of the output and the deduplication are the '
+                          'same regardless of the number of workers')
+oparser.add_argument('--workers-batch-size', dest='workers_batch_size', type=int, default=32,
+                     help='Number of records processed at once: they are sent to a worker at once (if --workers > '
+                          '1) and their boilerplate is removed at once (if --boilerpipe)')
 options = oparser.parse_args()
 
 logging.basicConfig(
@@ -259,15 +459,19 @@ else:
 seen_html = set()
 seen_plain_text = set()
 
-magic.Magic(mime=True)
+# The libraries are imported only if the options need them (this script is started once per WARC)
+text_extractor = get_extractor(options.parser)
+
+encoding_resolver = EncodingResolver(detect_size=options.encoding_detection_size)
+mime_resolver = MimeResolver(trust_headers=options.mime_detection == 'headers',
+                             sniff_prefix=options.mime_detection != 'libmagic')
+
+if options.html5lib or options.parser == "lxml":
+    import html5lib
+    from lxml import etree
 
 languages = []
 banned = []
-if options.langid == "cld3":
-    import cld3
-    cld3model = cld3.LanguageIdentifier()
-else:
-    import pycld2 as cld2
 
 if options.langs:
     for l in options.langs.split(','):
@@ -285,15 +489,30 @@ if languages:
     if options.l2 is not None:
         languages.append(options.l2)
 
+language_identifier = LanguageIdentifier(options.langid, languages=languages, banned=banned,
+                                         sample_size=options.langid_sample_size,
+                                         sample_spans=options.langid_sample_spans)
+
 previous_crawl_hashes = set()
+hash_indexes = []
 
 if not os.path.exists(options.outDir):
     os.makedirs(options.outDir)
 
+if options.inputHash or options.hashIndex:
+    from monotextor.utils import hash_index
+
 if options.inputHash:
-    with open_xz_or_gzip(options.inputHash, 'r') as fh:
-        for line in fh:
-            previous_crawl_hashes.add(int(line.strip()))
+    if hash_index.is_hash_index(options.inputHash):
+        # memory-mapped: the hashes are not loaded in memory
+        hash_indexes.append(hash_index.HashIndex(options.inputHash))
+    else:
+        with open_xz_or_gzip(options.inputHash, 'r') as fh:
+            for line in fh:
+                previous_crawl_hashes.add(int(line.strip()))
+
+if options.hashIndex and hash_index.is_hash_index(options.hashIndex):
+    hash_indexes.append(hash_index.HashIndex(options.hashIndex))
 
 plainTextHashFile = None
 if options.outputHash:
@@ -301,215 +520,41 @@ if options.outputHash:
 
 files_dict = dict()
 
-ExtrB = None
-if options.boilerpipe:
-    import jpype
-    if not jpype.isJVMStarted():
-        jars = []
-        for top, dirs, files in os.walk(
-            os.path.dirname(importlib.machinery.PathFinder().find_module("boilerpipe").get_filename()) + '/data'
-        ):
-            for nm in files:
-                if nm[-4:] == ".jar":
-                    jars.append(os.path.join(top, nm))
-        jpype.addClassPath(os.pathsep.join(jars))
-        jpype.startJVM(jpype.getDefaultJVMPath(), convertStrings=False)
-    from boilerpipe.extract import Extractor as ExtrB
-
-for record in f:
-    plaintext = ""
-    # Initial checks
-    if record.rec_type != 'response' and record.rec_type != 'resource':
-        continue
-    if record.rec_headers.get_header('WARC-Target-URI')[0] == '<' \
-            and record.rec_headers.get_header('WARC-Target-URI')[-1] == '>':
-        url = record.rec_headers.get_header('WARC-Target-URI')[1:-1]
-    else:
-        url = record.rec_headers.get_header('WARC-Target-URI')
-    if url == "unknown":
-        logging.info("Skipping page with unknown URL")
-        continue
-    url = url.replace('\t', ' ')
-    if url[-4:] == ".gif" or url[-4:] == ".jpg" or url[-5:] == ".jpeg" or url[-4:] == ".png" or url[-4:] == ".css" \
-            or url[-3:] == ".js" or url[-4:] == ".mp3" or url[-4:] == ".mp4" or url[-4:] == ".ogg" \
-            or url[-5:] == ".midi" or url[-4:] == ".swf":
-        continue
-
-    # Ignore robots.txt when processing records
-    if url[-11:] == "/robots.txt":
-        continue
-
-    payload = record.content_stream().read()
-
-    # We convert into UTF8 first of all
-    orig_encoding, text = convert_encoding(payload)
-
-    # Fix HTML issues with html5lib if activated through parameters
-    if options.html5lib or options.parser == "lxml":
-        document = html5lib.parse(remove_control_characters(bytes(text, 'utf8')),
-                                  treebuilder="lxml", namespaceHTMLElements=False)
-        text = etree.tostring(document, encoding="utf8").decode('utf8')
-
-    logging.info("Processing document: " + url)
-    if orig_encoding is None:
-        logging.info("Encoding of document " + url + " could not be identified")
-        continue
-
-    date = record.rec_headers.get_header('WARC-Date')
-    recordId = record.rec_headers.get_header('WARC-Record-ID')
-
-    if len(text.strip()) == 0:
-        continue
+boilerplate_remover = None
+pool = None
 
-    # lang id
-    logging.info(url + ": detecting language")
-    lang = ""
+if options.workers > 1:
+    import multiprocessing
 
-    if options.langid == "cld2":
-        lang = guess_lang_from_data2(text)
-        if (len(languages) > 0 and lang not in languages) or (lang in banned):
-            logging.info("Language of document " + url + ": " + lang + ". Not among searched languages.")
-            continue
-        if lang == "un":
-            logging.info("Language of document " + url + " could not be identified")
-            continue
-        open_output_files(options, lang, files_dict)
-
-    # If enabled, remove boilerplate HTML
-    if options.boilerpipe:
-        logging.info(url + ": deboiling html")
-        extractor = ExtrB(extractor='ArticleExtractor', html=text)
-        deboiled = str(extractor.getHTML())
-    else:
-        deboiled = text
-
-    # We compute a hash on the HTML (either normalized one or after boilerpipe if enabled):
-    # if we get duplicate files we discard them
-    html_hash = mmh3.hash(deboiled, signed=False)
-    # checking for duplicate content (duplicates are discarded)
-    if html_hash in seen_html:
-        logging.info("Repeated file:\t" + url)
-        continue
-
-    # get text with beautifulsoup
-    if options.parser == "bs4":
-        logging.info(url + ": Getting text with BeautifulSoup")
-        try:
-            soup = BeautifulSoup(deboiled, "lxml")
-        except Exception as ex:
-            logging.info("Exception ocurred when processing " + url + " with BeautifulSoup")
-            continue
-
-        for script in soup(["script", "style", "img"]):
-            script.extract()  # rip it out
-        plaintext = soup.get_text()
-
-    # or get text with 'modest' library
-    elif options.parser == "modest":
-        logging.info(url + ": Getting text with modest (selectolax)")
-        try:
-            tree = HTMLParser(deboiled)
-        except BaseException:
-            logging.info("Tree structure issues in HTML/XML. Ignoring this document")
-            continue
-        for tag in tree.css('script'):
-            tag.decompose()
-        for tag in tree.css('style'):
-            tag.decompose()
-        for tag in tree.css('img'):
-            tag.decompose()
-        if tree.body is None:
-            logging.info("Body is empty. Ignoring this document")
-            continue
-        # TODO should separator='\n' be removed? It splits inline elements inside block elements...
-        plaintext = tree.body.text(separator='\n')
-
-    # or get text by moving through the lxml tree
-    elif options.parser == "lxml":
-        logging.info(url + ": Getting text with lxml")
-
-        plaintext = lxml.html.document_fromstring(deboiled).text_content()
-    # or use an HTML tokenizer
-    else:
-        logging.info(url + ": Getting text with HTML tokenizer")
-        parser = SimpleParser()
-        try:
-            parser.feed(text)
-            plaintext = parser.get_text()
-        except BaseException:
-            logging.info("Tree structure issues in HTML/XML. Ignoring this document")
-            continue
-    plaintext = re.sub(r"\n+", "\n",
-                       re.sub(r" *\n *", "\n",
-                              re.sub(r"[ \t\v\f]+", " ",
-                                     re.sub(r"\r", "",
-                                            plaintext.replace(u'\xa0', u' '))))).strip()
-    if options.langid == "cld3":
-        if plaintext:
-            lang = guess_lang_from_data3(cld3model, plaintext)
-            if (len(languages) > 0 and lang not in languages) or (lang in banned):
-                logging.info("Language of document " + url + ": " + lang + ". Not among searched languages.")
-                continue
-            if lang == "un":
-                logging.info("Language of document " + url + " could not be identified")
-                continue
-            open_output_files(options, lang, files_dict)
-        else:
-            continue
-
-    plaintext_hash = mmh3.hash(plaintext, signed=False)
-
-    if plaintext_hash in seen_plain_text or plaintext_hash in previous_crawl_hashes:
-        logging.info("Repeated plain text file:\t" + url)
-        continue
-
-    if len(plaintext) > 0:
-
-        seen_html.add(html_hash)
-        seen_plain_text.add(plaintext_hash)
-        # Guessing MIME of the file (checked on original content)
-        logging.info(url + ": Getting mime")
-
-        if options.paragraph_identification:
-            # Add paragraph index
-            plaintext = [f"{element}\t{idx}" for idx, element in enumerate(plaintext.strip().split("\n"))]
-            plaintext = '\n'.join(plaintext)
-
-        mime = magic.from_buffer(text, mime=True)
+    # The script runs at module level, so the workers are forked: with spawn or forkserver (the default in some
+    #  platforms) each worker would import the script and run it again
+    pool = multiprocessing.get_context("fork").Pool(options.workers, initializer=init_worker)
+    # Batches are processed by the workers, but collected in the same order they were read
+    results = (result
+               for batch in imap_ordered(pool, process_batch, batched(read_records(f), options.workers_batch_size),
+                                         options.workers * 2)
+               for result in batch)
+else:
+    init_worker()
+    results = (result
+               for batch in map(process_batch, batched(read_records(f), options.workers_batch_size))
+               for result in batch)
 
-        if not options.xzlang:
-            files_dict[lang]["mimeFile"].write(mime.encode() + b"\n")
-            files_dict[lang]["urlFile"].write(url.encode() + b"\n")
-            files_dict[lang]["encodingFile"].write(orig_encoding.encode() + b"\n")
+for result in results:
+    if result is not None:
+        write_result(result)
+        # Released before the next record is processed
+        result = None
 
-            b64norm = base64.b64encode(text.encode())
-            files_dict[lang]["normHtmlFile"].write(b64norm + b"\n")
+if pool is not None:
+    pool.close()
+    pool.join()
 
-            if options.boilerpipe:
-                b64deboil = base64.b64encode(deboiled.encode())
-                files_dict[lang]["deboilFile"].write(b64deboil + b"\n")
+if boilerplate_remover is not None:
+    boilerplate_remover.close()
 
-            b64text = base64.b64encode(html.unescape(plaintext).encode())
-            files_dict[lang]["plainTextFile"].write(b64text + b"\n")
-
-        # append to language specific file
-        else:
-            langfile = lzma.open(options.outDir + "/" + lang, mode="a", format=lzma.FORMAT_XZ)
-            header = "Content-Location: " + url + "\n"
-            header += "Content-Type: " + mime + "\n"
-            header += "Content-Language: " + lang + "\n"
-            header += "Content-Length: " + str(len(plaintext)) + "\n"
-            header += "Date: " + date + "\n"
-            header += "X-WARC-Record-ID: " + recordId + "\n"
-            header += "X-WARC-Filename: " + options.input + "\n"
-            langfile.write(header.encode())
-            langfile.write(b"\n")
-            langfile.write(plaintext.encode())
-            langfile.write(b"\n")
-            langfile.close()
-
-        if options.outputHash:
-            plainTextHashFile.write(str(plaintext_hash).encode() + b"\n")
+encoding_resolver.log_counts()
+mime_resolver.log_counts()
 
 if not options.xzlang:
     for lang in files_dict:
@@ -522,3 +567,8 @@ if not options.xzlang:
             files_dict[lang]["deboilFile"].close()
 if options.outputHash:
     plainTextHashFile.close()
+
+for index in hash_indexes:
+    index.close()
+if options.hashIndex:
+    hash_index.append(options.hashIndex, seen_plain_text)
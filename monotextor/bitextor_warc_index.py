@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+import sys
+import gzip
+import argparse
+import logging
+
+from warcio.archiveiterator import ArchiveIterator
+
+from monotextor.utils.common import open_xz_or_gzip_or_plain
+
+COPY_BLOCK_SIZE = 1 << 20
+
+
+def build_index(warc_path, writer):
+    # CDX-like index: offset, length, record type and URI of each record
+    #  For gzip-compressed WARCs the offsets point to the gzip members, so each record can be read independently
+    norecords = 0
+
+    with open(warc_path, 'rb') as warc:
+        archive_iterator = ArchiveIterator(warc)
+
+        for record in archive_iterator:
+            offset = archive_iterator.get_record_offset()
+            length = archive_iterator.get_record_length()
+            uri = record.rec_headers.get_header('WARC-Target-URI')
+            uri = uri.replace('\t', ' ') if uri else '-'
+
+            writer.write(f"{offset}\t{length}\t{record.rec_type}\t{uri}\n")
+
+            norecords += 1
+
+    return norecords
+
+
+def read_index(index_path):
+    records = []
+
+    with open_xz_or_gzip_or_plain(index_path) as index:
+        for line in index:
+            offset, length = line.split('\t', 2)[:2]
+
+            records.append((int(offset), int(length)))
+
+    return records
+
+
+def get_range(records, part, parts):
+    # Byte range of the records whose offset falls in the part-th of 'parts' equally sized (in bytes) ranges
+    #  The boundaries are always aligned to records, so the range is a valid WARC
+    if not records:
+        return 0, 0
+
+    total = records[-1][0] + records[-1][1]
+    start_limit = total * part // parts
+    end_limit = total * (part + 1) // parts
+    selected = [(offset, length) for offset, length in records if start_limit <= offset < end_limit]
+
+    if not selected:
+        return 0, 0
+
+    return selected[0][0], selected[-1][0] + selected[-1][1]
+
+
+def copy_range(warc_path, start, end, writer):
+    with open(warc_path, 'rb') as warc:
+        warc.seek(start)
+        remaining = end - start
+
+        while remaining > 0:
+            block = warc.read(min(COPY_BLOCK_SIZE, remaining))
+
+            if not block:
+                raise Exception(f"unexpected end of file: {warc_path} (offset {end - remaining})")
+
+            writer.write(block)
+            remaining -= len(block)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build a byte offset index of the records of a WARC file or, if "
+                                                 "an index is provided, write a byte range of the WARC which contains "
+                                                 "the records of one of N parts, so a single WARC can be processed in "
+                                                 "parallel",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('--input', required=True,
+                        help="WARC file (either uncompressed or gzip-compressed per record)")
+    parser.add_argument('--output', default='-',
+                        help="Output index (plain or gz) or, if --index is provided, output WARC")
+    parser.add_argument('--index',
+                        help="Index of the WARC, created with this same script")
+    parser.add_argument('--part', type=int, default=0,
+                        help="Part of the WARC which will be written (starting at 0)")
+    parser.add_argument('--parts', type=int, default=1,
+                        help="Number of parts in which the WARC is split")
+    parser.add_argument('--logging-level', type=int, default=logging.INFO,
+                        help="Logging level")
+
+    args = parser.parse_args()
+
+    if args.input[-3:] == ".xz":
+        parser.error("xz-compressed WARCs can't be read by byte ranges")
+    if args.part < 0 or args.part >= args.parts:
+        parser.error(f"--part must be in the range [0, {args.parts})")
+
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    logging.basicConfig(level=args.logging_level)
+
+    if args.index:
+        start, end = get_range(read_index(args.index), args.part, args.parts)
+        writer = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+
+        copy_range(args.input, start, end, writer)
+
+        if args.output == '-':
+            writer.flush()
+        else:
+            writer.close()
+
+        logging.debug("Part %d of %d: bytes [%d, %d)", args.part, args.parts, start, end)
+    else:
+        if args.output == '-':
+            writer = sys.stdout
+        elif args.output[-3:] == ".gz":
+            writer = gzip.open(args.output, 'wt')
+        else:
+            writer = open(args.output, 'w')
+
+        with writer:
+            norecords = build_index(args.input, writer)
+
+        logging.debug("%d records were indexed", norecords)
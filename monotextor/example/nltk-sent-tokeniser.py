@@ -29,3 +29,5 @@ for line in sys.stdin:
     for sentence in tokenizer.tokenize(line):
         for endlinesentence in sentence.split('\n'):
             print(endlinesentence)
+    # flush after each line, so it can be used as a persistent splitter
+    sys.stdout.flush()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Aggregate the split documents of every batch of a language in a single file with the columns url and sentence
+#
+# Each batch is decoded and flattened by a worker in its own compressed chunk (temporary file), and the chunks
+#  are concatenated in the same order of the batches: both gzip members and zstd frames can be concatenated
+
+import os
+import gzip
+import shutil
+import logging
+import argparse
+import subprocess
+import multiprocessing
+
+from monotextor.utils.common import imap_ordered
+from monotextor.utils.b64_docs import read_docs
+
+COPY_BLOCK_SIZE = 1 << 20
+WRITE_BUFFER_SIZE = 1 << 22
+
+
+def open_chunk(path, compression, level):
+    if compression == "gzip":
+        return gzip.open(path, 'wb', compresslevel=level)
+    if compression == "zstd":
+        # Optional dependency
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=level).stream_writer(open(path, 'wb'), closefd=True)
+
+    # The compression is applied when the chunks are concatenated (pigz) or never (none)
+    return open(path, 'wb')
+
+
+def flatten_batch(task):
+    plain_path, url_path, chunk_path, compression, level = task
+    nodocs = 0
+    nolines = 0
+    buffer = []
+    buffer_size = 0
+
+    with open_chunk(chunk_path, compression, level) as o, \
+         gzip.open(plain_path, 'r') as p, gzip.open(url_path, 'rt') as u:
+        for doc in read_docs(p):
+            docurl = u.readline().strip()
+            lines = doc.decode('utf8', errors='ignore').split('\n')
+            output = ''.join(f"{docurl}\t{line}\n" for line in lines if line).encode('utf8')
+
+            buffer.append(output)
+            buffer_size += len(output)
+            nodocs += 1
+            nolines += output.count(b'\n')
+
+            if buffer_size >= WRITE_BUFFER_SIZE:
+                o.write(b''.join(buffer))
+                buffer = []
+                buffer_size = 0
+
+        o.write(b''.join(buffer))
+
+    return chunk_path, nodocs, nolines
+
+
+def aggregate(plain_files, url_files, output, workers=1, compression="gzip", level=6):
+    if len(plain_files) != len(url_files):
+        raise Exception(f"Different number of documents and URL files: {len(plain_files)} vs {len(url_files)}")
+
+    tasks = [(plain, url, f"{output}.tmp{os.getpid()}.{idx}", compression, level)
+             for idx, (plain, url) in enumerate(zip(plain_files, url_files))]
+    total_docs = 0
+    total_lines = 0
+    pigz = None
+
+    if compression == "pigz":
+        with open(output, 'wb') as o:
+            pigz = subprocess.Popen(["pigz", "-c", "-p", str(workers), f"-{level}"], stdin=subprocess.PIPE, stdout=o)
+
+        writer = pigz.stdin
+    else:
+        writer = open(output, 'wb')
+
+    def concatenate(results):
+        nonlocal total_docs, total_lines
+
+        for chunk_path, nodocs, nolines in results:
+            with open(chunk_path, 'rb') as chunk:
+                shutil.copyfileobj(chunk, writer, COPY_BLOCK_SIZE)
+
+            os.unlink(chunk_path)
+
+            total_docs += nodocs
+            total_lines += nolines
+
+    try:
+        if workers > 1:
+            with multiprocessing.Pool(workers) as pool:
+                concatenate(imap_ordered(pool, flatten_batch, tasks, workers * 2))
+        else:
+            concatenate(map(flatten_batch, tasks))
+    finally:
+        for task in tasks:
+            if os.path.isfile(task[2]):
+                os.unlink(task[2])
+
+        writer.close()
+
+        if pigz is not None:
+            returncode = pigz.wait()
+
+            if returncode != 0:
+                raise Exception(f"pigz exited with the non-zero code {returncode}")
+
+    return total_docs, total_lines
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Aggregate the base64-encoded split documents of several batches "
+                                                 "in a single file with a sentence per line and the columns url and "
+                                                 "sentence. Batches are processed in parallel and the output keeps "
+                                                 "their order",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('--plain', nargs='+', required=True,
+                        help="gz-compressed files with a base64-encoded document per line (e.g. sentences.gz)")
+    parser.add_argument('--url', nargs='+', required=True,
+                        help="gz-compressed files with the URL of each document (same order as --plain)")
+    parser.add_argument('--output', required=True,
+                        help="Output file")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of batches which are processed in parallel")
+    parser.add_argument('--compression', choices=["gzip", "pigz", "zstd", "none"], default="gzip",
+                        help="Compression of the output: gzip (each worker compresses its batch), pigz (the "
+                             "concatenated batches are compressed by pigz), zstd (each worker compresses its batch; "
+                             "zstandard is required) or none")
+    parser.add_argument('--level', type=int, default=6,
+                        help="Compression level")
+    parser.add_argument('--logging-level', type=int, default=logging.INFO,
+                        help="Logging level")
+
+    args = parser.parse_args()
+
+    if args.workers < 1:
+        parser.error("--workers must be greater than 0")
+
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    logging.basicConfig(level=args.logging_level)
+
+    nodocs, nolines = aggregate(args.plain, args.url, args.output, workers=args.workers, compression=args.compression,
+                                level=args.level)
+
+    logging.info("%d documents were aggregated (%d lines)", nodocs, nolines)
@@ -1,5 +1,6 @@
 import sys
 import re
+import argparse
 
 email_regex = r"(\b|^)([a-zA-Z0-9.!#$%&'*+/=?^_`{|}~-]+@[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?(?:\.[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?)*)(\b|$)"
 phone_regex = r"(?![\-\–\(]?\s*\d{2,4}\s*[\-\–\s]\s*\d{3,4}\s*[\-\–\(]?)[\+\-\–\(\d].[\(\)' '\+\-\–\d]{6,12}\d{2}\b"
@@ -9,12 +10,77 @@ IPv6_regex = r"(([0-9a-fA-F]{1,4}:){7,7}[0-9a-fA-F]{1,4}|([0-9a-fA-F]{1,4}:){1,7
 
 all_regex = re.compile(r"(" + email_regex + r")|(" + phone_regex +r")|(" + IPv4_regex + r")|(" + IPv6_regex + r")")
 
-for line in sys.stdin:
-    line_strip = line.rstrip()
-    text = line_strip.split('\t')[1]
-    match = all_regex.search(text)
-    if match is None:
-        print(line_strip, 'no', sep='\t')
-    else:
-        print(line_strip, 'yes', sep='\t')
-        #print(match, line, file=sys.stderr)
+# Every match needs, at least, one of these characters: emails need '@', IPv6 addresses need ':', and
+#  phone numbers and IPv4 addresses need digits (any Unicode digit in the case of phone numbers), so most
+#  of the lines are discarded with a single scan and without running the regular expressions
+prefilter_regex = re.compile(r"[@:\d]")
+digit_regex = re.compile(r"\d")
+
+# The lines which pass the prefilter are checked only with the regular expressions whose required characters
+#  are present (cheapest checks first). A line matches all_regex iff it matches any of the regular expressions
+categories = [
+    ("email", lambda text: '@' in text, re.compile(email_regex)),
+    ("ipv6", lambda text: ':' in text, re.compile(IPv6_regex)),
+    ("ipv4", lambda text: '.' in text and digit_regex.search(text), re.compile(IPv4_regex)),
+    ("phone", digit_regex.search, re.compile(phone_regex)),
+]
+
+
+def scan(text, all_categories=False):
+    # Categories of sensitive data found in the text (only the first one unless all_categories is set)
+    if not prefilter_regex.search(text):
+        return []
+
+    matched = []
+
+    for category, required_chars, regex in categories:
+        if required_chars(text) and regex.search(text):
+            matched.append(category)
+
+            if not all_categories:
+                break
+
+    return matched
+
+
+def process(input_fd, output_fd, add_categories=False, batch_size=10000):
+    output = []
+
+    for line in input_fd:
+        line_strip = line.rstrip()
+        text = line_strip.split('\t')[1]
+        matched = scan(text, all_categories=add_categories)
+
+        if add_categories:
+            output.append(f"{line_strip}\t{'yes' if matched else 'no'}\t{','.join(matched)}\n")
+        else:
+            output.append(f"{line_strip}\t{'yes' if matched else 'no'}\n")
+
+        if len(output) >= batch_size:
+            output_fd.write(''.join(output))
+            output = []
+
+    output_fd.write(''.join(output))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Look for sensitive data (emails, phone numbers, IPv4 and IPv6 "
+                                                 "addresses) in the second column of the input and append a column "
+                                                 "with 'yes' or 'no'",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('--categories', action='store_true',
+                        help="Append another column with the comma-separated categories of sensitive data which "
+                             "were found (email, ipv6, ipv4, phone)")
+    parser.add_argument('--batch-size', type=int, default=10000,
+                        help="Number of lines which are written at once")
+
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    process(sys.stdin, sys.stdout, add_categories=args.categories, batch_size=args.batch_size)
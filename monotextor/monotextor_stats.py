@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Streaming stats of a tab-separated corpus (units, i.e. sentences or paragraphs, words, characters, documents and
+#  totals per domain), so the stats are computed while the corpus is written (--passthrough) instead of reading it
+#  again. The stats are stored as JSON
+#
+# Units are the lines of the corpus (the last one is counted even without line break) and words are separated by
+#  any Unicode whitespace (str.split()). This is not always what 'cut -f {text_column} | wc -lw' counts: the
+#  characters which separate words in wc depend on the locale and on its version
+
+import sys
+import json
+import time
+import logging
+import argparse
+from urllib.parse import urlsplit
+
+
+class StatsCollector(object):
+
+    def __init__(self, text_column=2, url_column=None):
+        self.text_idx = text_column - 1
+        self.url_idx = url_column - 1 if url_column else None
+        self.maxsplit = max(self.text_idx, self.url_idx if self.url_idx is not None else 0) + 1
+        self.units = 0
+        self.words = 0
+        self.characters = 0
+        self.bytes = 0
+        self.documents = 0
+        self.domains = {}
+        self.start_time = time.time()
+        self._last_url = None
+        self._domain = None
+
+    def add(self, line):
+        self.units += 1
+        self.bytes += len(line)
+
+        fields = line.rstrip(b'\n').split(b'\t', self.maxsplit)
+
+        if len(fields) > self.text_idx:
+            text = fields[self.text_idx]
+        elif len(fields) == 1:
+            # cut prints the lines without delimiter
+            text = fields[0]
+        else:
+            text = b''
+
+        text = text.decode('utf-8', errors='replace')
+        # Unicode whitespace, e.g. no-break spaces, separates words too
+        words = len(text.split())
+        characters = len(text)
+
+        self.words += words
+        self.characters += characters
+
+        if self.url_idx is None:
+            return
+
+        url = fields[self.url_idx] if len(fields) > self.url_idx else b''
+
+        if url != self._last_url:
+            # Rows of the same document are consecutive
+            self._last_url = url
+            self._domain = self.get_domain(url)
+            self.documents += 1
+            new_document = 1
+        else:
+            new_document = 0
+
+        domain = self.domains.get(self._domain)
+
+        if domain is None:
+            domain = self.domains[self._domain] = {"units": 0, "words": 0, "characters": 0, "documents": 0}
+
+        domain["units"] += 1
+        domain["words"] += words
+        domain["characters"] += characters
+        domain["documents"] += new_document
+
+    @staticmethod
+    def get_domain(url):
+        try:
+            return urlsplit(url.decode('utf-8', errors='replace')).hostname or ''
+        except ValueError:
+            return ''
+
+    def get_stats(self, name="", unit="Sentences"):
+        elapsed = time.time() - self.start_time
+        stats = {
+            "name": name,
+            "unit": unit,
+            "units": self.units,
+            "words": self.words,
+            "characters": self.characters,
+            "bytes": self.bytes,
+            "elapsed_seconds": round(elapsed, 3),
+            "units_per_second": round(self.units / elapsed, 3) if elapsed > 0 else None,
+            "bytes_per_second": round(self.bytes / elapsed, 3) if elapsed > 0 else None,
+        }
+
+        if self.url_idx is not None:
+            stats["documents"] = self.documents
+            stats["domains"] = self.domains
+
+        return stats
+
+
+def format_text(stats):
+    # Same lines as the plain text stats files
+    return f"{stats['unit']}: {stats['units']}\nWords: {stats['words']}\n"
+
+
+def collect(input_fd, collector, output_fd=None):
+    for line in input_fd:
+        collector.add(line)
+
+        if output_fd is not None:
+            output_fd.write(line)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compute the stats of a tab-separated corpus in a single pass and "
+                                                 "store them as JSON",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('--json',
+                        help="Output JSON file with the stats")
+    parser.add_argument('--passthrough', action='store_true',
+                        help="Write the input to stdout (like tee), so the stats can be computed while the corpus "
+                             "is written")
+    parser.add_argument('--text-column', type=int, default=2,
+                        help="Column (starting at 1) with the sentences or paragraphs")
+    parser.add_argument('--url-column', type=int,
+                        help="Column (starting at 1) with the URL of the document. If provided, documents and "
+                             "per-domain stats are computed")
+    parser.add_argument('--name', default="",
+                        help="Name of the stats (e.g. Raw)")
+    parser.add_argument('--unit', default="Sentences",
+                        help="Name of the units (e.g. Sentences or Paragraphs)")
+    parser.add_argument('--print-text', metavar="JSON",
+                        help="Print the units and words of a JSON file created with this script as they are written "
+                             "in the plain text stats files, and exit")
+    parser.add_argument('--logging-level', type=int, default=logging.INFO,
+                        help="Logging level")
+
+    args = parser.parse_args()
+
+    if not args.print_text and not args.json:
+        parser.error("either --json or --print-text must be provided")
+
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    logging.basicConfig(level=args.logging_level)
+
+    if args.print_text:
+        with open(args.print_text) as f:
+            sys.stdout.write(format_text(json.load(f)))
+
+        sys.exit(0)
+
+    collector = StatsCollector(text_column=args.text_column, url_column=args.url_column)
+
+    collect(sys.stdin.buffer, collector, output_fd=sys.stdout.buffer if args.passthrough else None)
+
+    stats = collector.get_stats(name=args.name, unit=args.unit)
+
+    with open(args.json, 'w') as f:
+        json.dump(stats, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+    logging.debug("%d %s, %d words", stats["units"], stats["unit"].lower(), stats["words"])
@@ -56,6 +56,53 @@ def create_id_key_2_file_map(files, id_offset=0, file_desc=None):
         raise ValueError(f"ERROR: Some files ({file_desc if file_desc else '-'}) could not be found:\n{bad_files_msg}")
     return id2file
 
+"""
+Split each provided WARC in byte ranges, each of which will be processed as an independent target
+    (xz-compressed WARCs can't be read by byte ranges, so they are not split)
+:param target2warcs: a dictionary with IDs as keys and provided WARCs as values, which is modified
+    in order to replace the split WARCs with their ranges
+:param splits: number of ranges in which each WARC is split
+:returns: a dictionary that relates the split targets to their WARCs, and a dictionary that relates each range
+    to its split target and the index of the range
+"""
+def create_warc_ranges(target2warcs, splits):
+    target2warc = {}
+    range2target = {}
+
+    if splits <= 1:
+        return target2warc, range2target
+
+    for target, warc in list(target2warcs.items()):
+        if warc[-3:] == ".xz":
+            continue
+
+        del target2warcs[target]
+        target2warc[target] = warc
+
+        for part in range(splits):
+            range_target = f"{target}.part{part}"
+            target2warcs[range_target] = warc
+            range2target[range_target] = (target, part)
+
+    return target2warc, range2target
+
+
+"""
+Get the command that writes the byte range of a WARC to stdout
+:param wildcards: wildcards of the preprocessing rule
+:param input: input of the preprocessing rule, i.e. the WARC and its index if the target is a range
+:returns: the command or an empty string if the target is not a range
+"""
+def get_warc_range_cmd(wildcards, input):
+    if wildcards.target not in TARGET_2_WARC_RANGES:
+        return ""
+
+    target, part = TARGET_2_WARC_RANGES[wildcards.target]
+
+    return f"python3 {WORKFLOW}/bitextor_warc_index.py --input {input[0]} --index {input[1]} " \
+           f"--part {part} --parts {WARC_RANGE_SPLITS}"
+
+
 """
 Obtains a list of WARCs produced by linguacrawl checkpoint
 :returns: a list of paths to generated WARCs
@@ -93,6 +140,11 @@ Get the input of the preprocessing rules
 def get_pproc_input(wildcards):
     target = wildcards.target
 
+    if target in TARGET_2_WARC_RANGES:
+        split_target, _ = TARGET_2_WARC_RANGES[target]
+
+        return [TARGET_2_WARCS[target], f"{DATADIR}/preprocess/{split_target}/warc_index.gz"]
+
     if CRAWLTARGET == "linguacrawl" and len(HOSTS) != 0:
         try:
             # Retrieve warcs names, that in first instance will fail because linguacrawl has not been executed yet
@@ -186,6 +238,23 @@ def get_batches(lang):
     return batches
 
 
+"""
+Obtain the files of a cleaning step for every batch of a language
+:param lang: target language
+:param pattern: output of the step, with the wildcards lang, shard and batch
+:returns: a list of paths, with the same order of the batches
+"""
+def get_batch_files(lang, pattern):
+    shards_batches = [batch.split("/")[-2:] for batch in get_batches(lang)]
+    return expand(
+        pattern,
+        zip,
+        lang=[lang] * len(shards_batches),
+        shard=[shard for shard, _ in shards_batches],
+        batch=[batch for _, batch in shards_batches],
+    )
+
+
 """
 Obtain a list of potprocessing batches/chunks (paths to batch files without the extension)
 :returns: a list of IDs of batches (just the numbers)
@@ -15,56 +15,116 @@
 
 import sys
 import shlex
-import base64
 import logging
 import argparse
-import contextlib
+import itertools
+import threading
 import subprocess
+from multiprocessing.pool import ThreadPool
+
+from monotextor.utils.common import ExternalTextProcessor, imap_ordered
+from monotextor.utils.b64_docs import iter_lines, decode_doc, encode_doc, open_docs, DocWriter
+
+# Persistent processes of the workers (one per thread)
+worker_data = threading.local()
+worker_processors = []
+worker_processors_lock = threading.Lock()
+
+def init_worker(command, delimiter, timeout):
+    worker_data.processor = ExternalTextProcessor(command, persistent=True, delimiter=delimiter, timeout=timeout)
+
+    with worker_processors_lock:
+        worker_processors.append(worker_data.processor)
+
+def process_doc_persistent(sentences, decode_errors='strict'):
+    # The output is reassembled per document thanks to the delimiter (or the number of lines) of the document
+    output = worker_data.processor.process(sentences.decode('utf-8', errors=decode_errors))
+
+    return output.encode('utf-8')
 
 def execute(command, input_file='-', use_shell=False, remove_empty_docs=False, empty_docs_value='Cg==',
-            is_plaintext=False, encode_errors='strict', decode_errors='strict'):
-    command = command if use_shell else shlex.split(command)
+            is_plaintext=False, encode_errors='strict', decode_errors='strict', persistent=False, workers=1,
+            delimiter=None, timeout=300):
     non_empty_docs = 0
     empty_docs = 0
     processed_sentences = 0
     total_sentences = 0
-    cm = contextlib.nullcontext(sys.stdin)
+    pool = None
+
+    if persistent:
+        # The command is executed once per worker instead of once per document
+        command = ["/bin/sh", "-c", command] if use_shell else shlex.split(command)
+        pool = ThreadPool(workers, initializer=init_worker, initargs=(command, delimiter, timeout))
+    else:
+        command = command if use_shell else shlex.split(command)
+
+    def read_docs(doc_fd):
+        for doc in iter_lines(doc_fd):
+            if is_plaintext:
+                yield str(doc, 'utf-8').strip().encode('utf-8', errors=encode_errors)
+            else:
+                yield decode_doc(doc)
 
-    if input_file != '-':
-        cm = open(input_file)
+    def process_docs(docs):
+        for sentences in docs:
+            # Execute command for the sentences of the current document, BASE64-decoded
+            command_result = subprocess.Popen(command, shell=use_shell, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
 
-    with cm as doc_fd:
-        for idx, doc in enumerate(doc_fd):
-            try:
-                doc = doc.strip()
+            yield sentences, command_result.communicate(sentences)[0]
 
-                if is_plaintext:
-                    sentences = doc.encode('utf-8', errors=encode_errors)
-                else:
-                    sentences = base64.b64decode(doc)
+    def process_docs_persistent(docs):
+        # Documents are processed by the workers, but the results are returned in the same order
+        def process(sentences):
+            return sentences, process_doc_persistent(sentences, decode_errors=decode_errors)
 
-                total_sentences += sentences.decode('utf-8', errors=decode_errors).strip().count('\n') + 1
+        yield from imap_ordered(pool, process, docs, workers * 2)
 
-                # Execute command for the sentences of the current document, BASE64-decoded
-                command_result = subprocess.Popen(command, shell=use_shell, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
-                sentences = command_result.communicate(sentences)[0]
+    empty_doc = empty_docs_value.encode('utf-8') + b'\n'
 
-                processed_sentences += sentences.decode('utf-8', errors=decode_errors).strip().count('\n') + 1
+    completed = False
 
-                sentences = base64.b64encode(sentences).decode('utf-8', errors=decode_errors)
+    try:
+        with open_docs(input_file) as doc_fd, DocWriter(sys.stdout.buffer) as writer:
+            results = process_docs_persistent(read_docs(doc_fd)) if persistent else process_docs(read_docs(doc_fd))
 
-                if sentences.strip() != '':
-                    print(sentences)
-                    non_empty_docs += 1
-                elif not remove_empty_docs:
-                    # Print, at least, a minimum document content -> #input documents = #output documents
-                    print(empty_docs_value)
-                    empty_docs += 1
-                else:
-                    empty_docs += 1
+            for idx in itertools.count():
+                try:
+                    result = next(results, None)
 
-            except Exception as e:
-                raise Exception(f"doc #{idx + 1} could not be processed") from e
+                    if result is None:
+                        break
+
+                    sentences, output = result
+
+                    total_sentences += sentences.strip().count(b'\n') + 1
+                    processed_sentences += output.strip().count(b'\n') + 1
+
+                    if output:
+                        writer.write_line(encode_doc(output))
+                        non_empty_docs += 1
+                    elif not remove_empty_docs:
+                        # Print, at least, a minimum document content -> #input documents = #output documents
+                        writer.write_line(empty_doc)
+                        empty_docs += 1
+                    else:
+                        empty_docs += 1
+
+                except Exception as e:
+                    raise Exception(f"doc #{idx + 1} could not be processed") from e
+
+        completed = True
+    finally:
+        if pool is not None:
+            # On error, the pending documents are not processed, but the commands are still closed
+            if completed:
+                pool.close()
+            else:
+                pool.terminate()
+
+            pool.join()
+
+            for processor in worker_processors:
+                processor.close()
 
     logging.debug("%d documents were empty, and %d were not", empty_docs, non_empty_docs)
     logging.debug("%d sentences were returned (initial sentences: %d)", processed_sentences - (0 if remove_empty_docs else empty_docs), total_sentences)
@@ -90,11 +150,29 @@ def parse_args():
                         help="How encoding errors should be handled. Check 'errors' parameter from 'encode' method")
     parser.add_argument('--decode-errors', default='strict',
                         help="How decoding errors should be handled. Check 'errors' parameter from 'decode' method")
+    parser.add_argument('--persistent', action='store_true',
+                        help="Execute the command once (once per worker) instead of once per document. The documents are "
+                             "streamed through the stdin/stdout of the command, which must flush its output after each line")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of persistent instances of the command which will process documents in parallel. "
+                             "The output keeps the order of the input")
+    parser.add_argument('--delimiter',
+                        help="Line written after each document in persistent mode, which the command must pass through "
+                             "unchanged (i.e. as a line of its own in its output). By default, the command is expected to "
+                             "return a line per input line instead")
+    parser.add_argument('--timeout', type=float, default=300,
+                        help="Seconds the command has to return each line in persistent mode. Otherwise, it is killed "
+                             "and started again")
     parser.add_argument('--logging-level', type=int, default=logging.INFO,
                         help="Logging level")
 
     args = parser.parse_args()
 
+    if args.workers < 1:
+        parser.error("--workers must be greater than 0")
+    if args.workers > 1 and not args.persistent:
+        parser.error("--workers is only supported with --persistent")
+
     return args
 
 if __name__ == '__main__':
@@ -104,4 +182,5 @@ if __name__ == '__main__':
 
     execute(args.command, input_file=args.input, use_shell=args.use_shell, remove_empty_docs=args.remove_empty_docs,
             empty_docs_value=args.empty_docs_value, is_plaintext=args.input_is_not_base64, encode_errors=args.encode_errors,
-            decode_errors=args.decode_errors)
+            decode_errors=args.decode_errors, persistent=args.persistent, workers=args.workers,
+            delimiter=args.delimiter if args.delimiter else None, timeout=args.timeout)
@@ -88,7 +88,7 @@ def validate_args(config):
         'parallelWorkers': {
             'type': 'dict',
             'allowed': [
-                'split', 'monofixer', 'monocleaner', 'sensitiveData', 'filter', 'sents'
+                'warc2preprocess', 'split', 'monofixer', 'monocleaner', 'sensitiveData', 'filter', 'sents'
             ],
             'valuesrules': {'type': 'integer', 'min': 1}
         },
@@ -132,6 +132,7 @@ def validate_args(config):
         'langs': {'type': 'list'},
         'shards': {'type': 'integer', 'min': 0, 'default': 8},
         'batches': {'type': 'integer', 'min': 1, 'default': 1024},
+        'warcRangeSplits': {'type': 'integer', 'min': 1, 'default': 1},
         'paragraphIdentification': {'type': 'boolean', 'default': False},
         # specific to warc2text:
         'writeHTML': {'type': 'boolean', 'dependencies': {'preprocessor': 'warc2text'}},
@@ -143,9 +144,18 @@ def validate_args(config):
             'allowed': ['cld2', 'cld3'],
             'dependencies': {'preprocessor': 'warc2preprocess'}
         },
+        'langIDSampleSize': {'type': 'integer', 'min': 0, 'dependencies': {'preprocessor': 'warc2preprocess'}},
+        'langIDSampleSpans': {'type': 'integer', 'min': 1, 'dependencies': {'preprocessor': 'warc2preprocess'}},
+        'langIDPrefilter': {'type': 'boolean', 'dependencies': {'preprocessor': 'warc2preprocess'}},
+        'boilerplateEngine': {
+            'type': 'string',
+            'allowed': ['boilerpipe', 'density'],
+            'dependencies': {'preprocessor': 'warc2preprocess'}
+        },
+        'maxDocumentSize': {'type': 'integer', 'min': 0, 'dependencies': {'preprocessor': 'warc2preprocess'}},
         'parser': {
             'type': 'string',
-            'allowed': ['bs4', 'modest', 'simple', 'lxml'],
+            'allowed': ['lexbor', 'bs4', 'modest', 'simple', 'lxml'],
             'dependencies': {'preprocessor': 'warc2preprocess'}
         },
         'html5lib': {'type': 'boolean', 'dependencies': {'preprocessor': 'warc2preprocess'}},
@@ -161,6 +171,7 @@ def validate_args(config):
         'pruneType': {'type': 'string', 'allowed': ['words', 'chars'], 'default': 'words'},
         'sentenceSplitters': {'type': 'dict'}, # TODO possible future implementation
         'customNBPs': {'type': 'dict'}, # TODO possible future implementation
+        'persistentSentenceSplitter': {'type': 'boolean', 'default': False},
         # post processing
         'deferred': {'type': 'boolean', 'default': False},
         'monofixer': {'type': 'boolean', 'default': False},
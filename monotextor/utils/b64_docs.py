@@ -0,0 +1,156 @@
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Codec of the files with a BASE64-encoded document per line
+#
+# The input is read in large binary blocks and the lines are decoded from memoryviews of the blocks, so there are
+#  no intermediate str objects nor copies of the lines (binascii ignores the line breaks and other whitespaces, so
+#  the lines don't need to be stripped either). The documents are returned as bytes: they are decoded only by
+#  the tools which need the text
+
+import sys
+import gzip
+import lzma
+import binascii
+import contextlib
+
+from monotextor.utils.common import batched
+
+READ_BLOCK_SIZE = 1 << 22
+WRITE_BUFFER_SIZE = 1 << 22
+# Characters encoded at once by write_text_doc
+ENCODE_BLOCK_SIZE = 1 << 18
+
+
+def iter_lines(fd, block_size=READ_BLOCK_SIZE):
+    # Lines (without the line break) of a binary file as memoryviews
+    remainder = b''
+
+    while True:
+        block = fd.read(block_size)
+
+        if not block:
+            break
+        if remainder:
+            block = remainder + block
+
+        view = memoryview(block)
+        start = 0
+        end = block.find(b'\n')
+
+        while end != -1:
+            yield view[start:end]
+
+            start = end + 1
+            end = block.find(b'\n', start)
+
+        remainder = block[start:]
+
+    if remainder:
+        yield memoryview(remainder)
+
+
+def decode_doc(line):
+    return binascii.a2b_base64(line)
+
+
+def encode_doc(doc):
+    # BASE64-encoded document with the line break
+    return binascii.b2a_base64(doc)
+
+
+def write_text_doc(fd, text, block_size=ENCODE_BLOCK_SIZE):
+    # Same as fd.write(encode_doc(text.encode())), but large texts are encoded in blocks, so neither the UTF-8
+    #  nor the BASE64 form of the whole text are held in memory
+    if len(text) <= block_size:
+        fd.write(binascii.b2a_base64(text.encode()))
+        return
+
+    pending = b''
+
+    for start in range(0, len(text), block_size):
+        data = pending + text[start:start + block_size].encode()
+        # BASE64 encodes groups of 3 bytes: the rest is encoded with the next block
+        end = len(data) - len(data) % 3
+
+        fd.write(binascii.b2a_base64(memoryview(data)[:end], newline=False))
+
+        pending = data[end:]
+
+    fd.write(binascii.b2a_base64(pending))
+
+
+def read_docs(fd, block_size=READ_BLOCK_SIZE):
+    for line in iter_lines(fd, block_size=block_size):
+        yield binascii.a2b_base64(line)
+
+
+def read_doc_batches(fd, batch_size, block_size=READ_BLOCK_SIZE):
+    yield from batched(read_docs(fd, block_size=block_size), batch_size)
+
+
+class DocWriter(object):
+
+    def __init__(self, fd, buffer_size=WRITE_BUFFER_SIZE):
+        self.fd = fd
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._buffered = 0
+
+    def write_line(self, line):
+        # line must include the line break (e.g. an encoded document)
+        self._buffer.append(line)
+        self._buffered += len(line)
+
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def write(self, doc):
+        self.write_line(binascii.b2a_base64(doc))
+
+    def write_batch(self, docs):
+        for doc in docs:
+            self.write_line(binascii.b2a_base64(doc))
+
+    def flush(self):
+        if self._buffer:
+            self.fd.write(b''.join(self._buffer))
+
+            self._buffer = []
+            self._buffered = 0
+
+        self.fd.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+
+@contextlib.contextmanager
+def open_docs(path, mode='rb'):
+    # Binary file ('-' for stdin or stdout), either plain, gz or xz
+    if path == '-':
+        yield sys.stdin.buffer if 'r' in mode else sys.stdout.buffer
+    elif path[-3:] == ".gz":
+        with gzip.open(path, mode) as f:
+            yield f
+    elif path[-3:] == ".xz":
+        with lzma.open(path, mode) as f:
+            yield f
+    else:
+        with open(path, mode) as f:
+            yield f
@@ -0,0 +1,290 @@
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Engines which remove the boilerplate of HTML documents (--boilerpipe of warc2preprocess)
+#
+# Every engine implements remove(htmls), which returns the deboiled HTML of each document of a batch (None if the
+#  boilerplate of the document could not be removed). The libraries are imported when the engine is created
+
+import os
+import re
+import html
+import logging
+
+from monotextor.utils.html_extraction import BLOCK_TAGS, LINE_BREAK_TAGS, NO_TEXT_TAGS
+
+# Tags whose text is kept with the same tag in the deboiled HTML (the text of the other blocks is kept in <p>)
+KEPT_TAGS = frozenset(["h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote"])
+WORD_RE = re.compile(r"\w")
+# Width of the lines in which the text of the blocks is wrapped to compute their text density
+LINE_WIDTH = 80
+
+
+def start_jvm():
+    # The JVM is started with the jars of boilerpipe, and the strings are not converted to Python strings
+    #  implicitly, so a document is only converted when its result is needed
+    import jpype
+    import importlib.util
+
+    if not jpype.isJVMStarted():
+        jars = []
+        for top, dirs, files in os.walk(os.path.dirname(importlib.util.find_spec("boilerpipe").origin) + '/data'):
+            for nm in files:
+                if nm[-4:] == ".jar":
+                    jars.append(os.path.join(top, nm))
+        jpype.addClassPath(os.pathsep.join(jars))
+        jpype.startJVM(jpype.getDefaultJVMPath(), convertStrings=False)
+
+    return jpype
+
+
+class BoilerplateRemover(object):
+    name = None
+
+    def remove(self, htmls):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class BoilerpipeRemover(BoilerplateRemover):
+    # Same result as str(boilerpipe.extract.Extractor(extractor=extractor, html=html).getHTML()), but the classes,
+    #  the extractor and the highlighter are looked up once, each document is converted to a Java string once
+    #  (instead of twice) and, with threads > 1, the documents of a batch are deboiled by a pool of Java threads
+    #  which is fed with a single call
+    name = "boilerpipe"
+
+    def __init__(self, extractor="ArticleExtractor", threads=1):
+        jpype = start_jvm()
+
+        self.jpype = jpype
+        self.extractor = jpype.JClass("de.l3s.boilerpipe.extractors." + extractor).INSTANCE
+        self.highlighter = jpype.JClass("de.l3s.boilerpipe.sax.HTMLHighlighter").newExtractingInstance()
+        self.sax_input = jpype.JClass("de.l3s.boilerpipe.sax.BoilerpipeSAXInput")
+        self.input_source = jpype.JClass("org.xml.sax.InputSource")
+        self.string_reader = jpype.JClass("java.io.StringReader")
+        self.array_list = jpype.JClass("java.util.ArrayList")
+        self.executor = None
+
+        if threads > 1:
+            self.executor = jpype.JClass("java.util.concurrent.Executors").newFixedThreadPool(threads)
+
+    def deboil(self, html):
+        # html is a Java string. The calls release the GIL while they run in Java, so the threads of the pool
+        #  deboil their documents in parallel
+        document = self.sax_input(self.input_source(self.string_reader(html))).getTextDocument()
+        self.extractor.process(document)
+
+        return self.highlighter.process(document, html)
+
+    def remove(self, htmls):
+        htmls = [self.jpype.JString(html) for html in htmls]
+
+        if self.executor is None:
+            results = []
+
+            for html in htmls:
+                try:
+                    results.append(str(self.deboil(html)))
+                except Exception as ex:
+                    logging.info("Boilerplate could not be removed: " + str(ex))
+                    results.append(None)
+
+            return results
+
+        tasks = self.array_list(len(htmls))
+
+        for html in htmls:
+            tasks.add(self.jpype.JProxy("java.util.concurrent.Callable",
+                                        dict={"call": lambda html=html: self.deboil(html)}))
+
+        # The whole batch is deboiled with a single call, which returns when all the documents are done
+        results = []
+
+        for future in self.executor.invokeAll(tasks):
+            try:
+                results.append(str(future.get()))
+            except Exception as ex:
+                logging.info("Boilerplate could not be removed: " + str(ex))
+                results.append(None)
+
+        return results
+
+    def close(self):
+        # The threads of the pool would keep the JVM alive
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+class TextBlock(object):
+    # Text between two block tags with the shallow text features of boilerpipe: words, words inside links and text
+    #  density (words per line once the text is wrapped, without the last line)
+    __slots__ = ("tag", "parts", "words", "link_words", "wrapped_lines", "line_length", "line_words")
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.parts = []
+        self.words = 0
+        self.link_words = 0
+        self.wrapped_lines = 0
+        self.line_length = -1
+        self.line_words = 0
+
+    def add(self, text, in_link):
+        # Line breaks of the source are not line breaks of the text
+        self.parts.append(text.replace("\n", " "))
+
+        for token in text.split():
+            if not WORD_RE.search(token):
+                continue
+
+            self.words += 1
+            self.line_words += 1
+            self.line_length += len(token) + 1
+
+            if in_link:
+                self.link_words += 1
+
+            if self.line_length > LINE_WIDTH:
+                self.wrapped_lines += 1
+                self.line_length = len(token)
+                self.line_words = 1
+
+    def link_density(self):
+        return self.link_words / self.words if self.words else 0.0
+
+    def text_density(self):
+        if not self.wrapped_lines:
+            return float(self.words)
+
+        return (self.words - self.line_words) / self.wrapped_lines
+
+
+EMPTY_BLOCK = TextBlock(None)
+
+
+def is_content(previous, current, following):
+    # DensityRulesClassifier of boilerpipe (Kohlschuetter et al., 2010): decision tree learnt on the link density
+    #  of the block and the previous one and on the text density of the block and its neighbours
+    if current.link_density() > 0.333333:
+        return False
+
+    if previous.link_density() <= 0.555556:
+        if current.text_density() <= 9:
+            if following.text_density() <= 10:
+                return previous.text_density() > 4
+            return True
+        return following.text_density() != 0
+
+    return following.text_density() > 11
+
+
+class DensityRemover(BoilerplateRemover):
+    # The body of the document (selectolax lexbor tree) is split in text blocks by the block tags, and the blocks
+    #  are classified as content or boilerplate by their text and link density, like the DefaultExtractor of
+    #  boilerpipe. The deboiled HTML is the text of the content blocks, each one in its own block tag. No JVM is
+    #  needed, so it is much cheaper to start and lighter than boilerpipe
+    name = "density"
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+
+        self.parser = LexborHTMLParser
+        self.no_text_tags = list(NO_TEXT_TAGS)
+
+    def split_blocks(self, body):
+        blocks = []
+        block = TextBlock("p")
+        # (node, inside a link, tag of the enclosing block); node is None at the end of a block tag
+        stack = [(child, False, "p") for child in reversed(list(body.iter(include_text=True)))]
+
+        while stack:
+            node, in_link, block_tag = stack.pop()
+
+            if node is None:
+                if block.words:
+                    blocks.append(block)
+                block = TextBlock(block_tag)
+                continue
+
+            tag = node.tag
+
+            if tag == "-text":
+                block.add(node.text(deep=False), in_link)
+                continue
+
+            if tag[0] == "-":
+                # Comments and other nodes without text
+                continue
+
+            if tag in LINE_BREAK_TAGS:
+                block.parts.append("\n")
+                continue
+
+            if tag in BLOCK_TAGS:
+                if block.words:
+                    blocks.append(block)
+                block = TextBlock(tag)
+                # The block that follows the end of the tag belongs to the enclosing block
+                stack.append((None, in_link, block_tag))
+                block_tag = tag
+
+            in_link = in_link or tag == "a"
+            stack.extend((child, in_link, block_tag) for child in reversed(list(node.iter(include_text=True))))
+
+        if block.words:
+            blocks.append(block)
+
+        return blocks
+
+    def deboil(self, document):
+        tree = self.parser(document)
+        body = tree.body
+
+        if body is None:
+            return None
+
+        tree.strip_tags(self.no_text_tags, recursive=True)
+        blocks = self.split_blocks(body)
+        parts = ["<html><body>\n"]
+
+        for i, block in enumerate(blocks):
+            previous = blocks[i - 1] if i else EMPTY_BLOCK
+            following = blocks[i + 1] if i + 1 < len(blocks) else EMPTY_BLOCK
+
+            if is_content(previous, block, following):
+                tag = block.tag if block.tag in KEPT_TAGS else "p"
+                text = "<br>".join(html.escape(' '.join(line.split()), quote=False)
+                                   for line in ''.join(block.parts).split("\n"))
+                parts.append(f"<{tag}>{text}</{tag}>\n")
+
+        parts.append("</body></html>\n")
+
+        return ''.join(parts)
+
+    def remove(self, htmls):
+        return [self.deboil(document) for document in htmls]
+
+
+REMOVERS = {remover.name: remover for remover in (BoilerpipeRemover, DensityRemover)}
+
+
+def get_remover(name, **kwargs):
+    if name not in REMOVERS:
+        raise Exception(f"unknown boilerplate removal engine: '{name}' (available: {', '.join(REMOVERS)})")
+
+    return REMOVERS[name](**kwargs)
@@ -20,19 +20,35 @@ except ImportError:
 
 import gzip
 from contextlib import contextmanager
+from collections import deque
 
 import subprocess
-import psutil
 import sys
 import os
-import requests
 import shlex
+import queue
+import logging
+import threading
 
 class ExternalTextProcessor(object):
 
-    def __init__(self, cmd, raise_exception=True, return_debug_data=False):
+    def __init__(self, cmd, raise_exception=True, return_debug_data=False, persistent=False, delimiter=None,
+                 max_restarts=3, timeout=300):
         self.raise_exception = raise_exception
         self.return_debug_data = return_debug_data
+        # Persistent mode: the command is executed once and the documents are streamed through its stdin/stdout
+        #  - delimiter protocol (delimiter is not None): the delimiter line is written after each document, and the
+        #     output of the document is everything until the delimiter line is returned by the command
+        #  - line-count protocol (delimiter is None): the command must return a line for each line of the input
+        # The command must flush its output after each line (or after each delimiter) and, if it crashes or it
+        #  does not return a line within timeout seconds (None to wait forever), it is killed and started again up
+        #  to max_restarts times for the same document
+        self.persistent = persistent
+        self.delimiter = delimiter
+        self.max_restarts = max_restarts
+        self.timeout = timeout
+        self.proc = None
+        self.output_lines = None
 
         if isinstance(cmd, str):
             # Split the command as bash does
@@ -44,6 +60,9 @@ class ExternalTextProcessor(object):
             self.cmd = cmd
 
     def process(self, input_text):
+        if self.persistent:
+            return self.process_persistent(input_text)
+
         proc = subprocess.Popen(self.cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         outs, errs = proc.communicate(input=bytes(input_text, encoding='utf-8'))
         output = outs.decode('utf-8')
@@ -58,6 +77,125 @@ class ExternalTextProcessor(object):
 
         return output
 
+    def start(self):
+        # stderr is not captured: nobody would read it and the command might block
+        self.proc = subprocess.Popen(self.cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        # The output is read from another thread, so the reads can time out. Each process has its own queue, so
+        #  the lines of a killed process are not mixed with the lines of the next one
+        self.output_lines = queue.Queue()
+        reader = threading.Thread(target=self._read, args=(self.proc.stdout, self.output_lines), daemon=True)
+        reader.start()
+
+    @staticmethod
+    def _read(stdout, output_lines):
+        for line in iter(stdout.readline, b''):
+            output_lines.put(line)
+
+        # EOF: the command has exited
+        output_lines.put(b'')
+
+    def kill(self):
+        self.proc.kill()
+
+        return self.close()
+
+    def close(self):
+        if self.proc is None:
+            return
+
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            pass
+
+        returncode = self.proc.wait()
+        self.proc = None
+
+        return returncode
+
+    def _write(self, data, errors):
+        try:
+            self.proc.stdin.write(data)
+            self.proc.stdin.flush()
+        except BrokenPipeError as e:
+            errors.append(e)
+
+    def process_persistent(self, input_text):
+        # The command needs complete lines, but the added line break is removed from the output later
+        added_line_break = bool(input_text) and input_text[-1] != '\n'
+
+        if added_line_break:
+            input_text += '\n'
+
+        if self.delimiter is None:
+            data = input_text
+            nolines = input_text.count('\n')
+        else:
+            data = f"{input_text}{self.delimiter}\n"
+            delimiter = f"{self.delimiter}\n".encode('utf-8')
+
+        data = data.encode('utf-8')
+
+        for attempt in range(self.max_restarts + 1):
+            if self.proc is None or self.proc.poll() is not None:
+                self.start()
+
+            errors = []
+            lines = []
+            finished = False
+            # The document is written from another thread: the command might fill the stdout pipe before reading
+            #  the whole document
+            writer = threading.Thread(target=self._write, args=(data, errors))
+            writer.start()
+
+            while True:
+                if self.delimiter is None and len(lines) == nolines:
+                    finished = True
+                    break
+
+                try:
+                    line = self.output_lines.get(timeout=self.timeout)
+                except queue.Empty:
+                    logging.warning("External tool did not return any line in %s seconds", self.timeout)
+                    returncode = self.kill()
+                    break
+
+                if not line:
+                    # EOF: the command has exited
+                    break
+                if self.delimiter is not None and line == delimiter:
+                    finished = True
+                    break
+
+                lines.append(line)
+
+            writer.join()
+
+            if finished and not errors:
+                output = b''.join(lines).decode('utf-8')
+
+                if added_line_break and output and output[-1] == '\n':
+                    output = output[:-1]
+
+                if self.return_debug_data:
+                    return output, '', 0
+
+                return output
+
+            if self.proc is not None:
+                returncode = self.close()
+
+            logging.warning("External tool exited with the code %s (attempt %d of %d)",
+                            returncode, attempt + 1, self.max_restarts + 1)
+
+        if self.raise_exception:
+            raise Exception(f"External tool could not process the document after {self.max_restarts} restarts")
+
+        if self.return_debug_data:
+            return '', '', returncode
+
+        return ''
+
 
 @contextmanager
 def open_xz_or_gzip_or_plain(file_path, mode='rt'):
@@ -84,6 +222,35 @@ def dummy_open():
     yield None
 
 
+def batched(iterable, size):
+    batch = []
+
+    for item in iterable:
+        batch.append(item)
+
+        if len(batch) >= size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def imap_ordered(pool, func, iterable, max_pending):
+    # Like pool.imap, but the input is consumed lazily: at most max_pending tasks are submitted
+    #  at the same time, so huge inputs (e.g. WARC records) are not loaded in memory by the pool
+    pending = deque()
+
+    for item in iterable:
+        pending.append(pool.apply_async(func, (item,)))
+
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+
+    while pending:
+        yield pending.popleft().get()
+
+
 def build_mappings(file_path_from, file_path_to, column=None, dem='\t'):
     mapping = {}
 
@@ -130,6 +297,9 @@ def check_lengths(file_path_from, file_path_to, throw=True):
 
 
 def get_all_ppids(pid, append_pid=False):
+    # Imported here: most of the scripts which use this module don't need psutil
+    import psutil
+
     result = []
 
     if append_pid:
@@ -219,6 +389,9 @@ def snake_no_more_race_set(file_path, value):
 
 
 def check_connection(url):
+    # Imported here: requests is slow to import and the rest of the module doesn't need it
+    import requests
+
     connection_error = False
     connection = None
 
@@ -0,0 +1,146 @@
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Encoding of the documents of the preprocessing scripts
+#
+# The payload is decoded as UTF-8 first: valid UTF-8 text is very unlikely to be in another encoding, and most of
+#  the documents are UTF-8, so they are decoded with a single pass and nothing is detected. Otherwise, the charset
+#  of the Content-Type header, the charset of the <meta> tags and the encoding detected by cchardet on the
+#  beginning of the document are tried in that order, and windows-1252 and iso-8859-1 (which never fails) are the
+#  last resort
+
+import re
+import codecs
+import logging
+
+UTF8, BOM, HEADER, META, DETECTED, FALLBACK = "utf-8", "bom", "header", "meta", "detected", "fallback"
+SOURCES = (UTF8, BOM, HEADER, META, DETECTED, FALLBACK)
+
+CHARSET_RE = re.compile(r"charset\s*=\s*[\"']?\s*([a-zA-Z0-9_.:-]+)", re.IGNORECASE)
+META_CHARSET_RE = re.compile(rb"<meta[^>]*?charset\s*=\s*[\"']?\s*([a-zA-Z0-9_.:-]+)", re.IGNORECASE)
+# Byte order marks of the encodings which are not compatible with ASCII (UTF-32 is checked before UTF-16)
+BOMS = ((codecs.BOM_UTF32_LE, "utf-32"), (codecs.BOM_UTF32_BE, "utf-32"),
+        (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+# Encodings which browsers decode as a superset of them
+SUPERSETS = {"ascii": "cp1252", "iso8859-1": "cp1252", "gb2312": "gbk"}
+FALLBACK_ENCODINGS = ("cp1252", "iso8859-1")
+# Bytes of the document where the <meta> tags are searched and bytes given to the detector
+META_SCAN_SIZE = 4096
+DETECT_SIZE = 4096
+LABEL_CACHE_SIZE = 4096
+
+
+class EncodingResolver(object):
+
+    def __init__(self, detect_size=DETECT_SIZE):
+        self.detect_size = detect_size
+        # Charset label -> Python codec (None if it is unknown)
+        self.label_cache = {}
+        self.counts = dict.fromkeys(SOURCES, 0)
+        self.encoding_counts = {}
+        self.cchardet = None
+
+    def lookup(self, label):
+        encoding = self.label_cache.get(label, False)
+
+        if encoding is False:
+            try:
+                encoding = codecs.lookup(label.strip().lower()).name
+            except LookupError:
+                encoding = None
+
+            encoding = SUPERSETS.get(encoding, encoding)
+
+            if len(self.label_cache) < LABEL_CACHE_SIZE:
+                self.label_cache[label] = encoding
+
+        return encoding
+
+    def from_header(self, content_type):
+        match = CHARSET_RE.search(content_type)
+
+        return self.lookup(match.group(1)) if match else None
+
+    def from_meta(self, data):
+        match = META_CHARSET_RE.search(data, 0, META_SCAN_SIZE)
+
+        return self.lookup(match.group(1).decode('ascii')) if match else None
+
+    def detect(self, data):
+        if self.cchardet is None:
+            import cchardet
+
+            self.cchardet = cchardet
+
+        label = self.cchardet.detect(data[:self.detect_size])['encoding']
+
+        return self.lookup(label) if label else None
+
+    def resolve(self, data, content_type=None):
+        # (encoding, source, text): encoding and source are None if the document is empty
+        if not data:
+            return None, None, ''
+
+        for bom, encoding in BOMS:
+            if data.startswith(bom):
+                try:
+                    return encoding, BOM, data.decode(encoding)
+                except UnicodeDecodeError:
+                    break
+
+        try:
+            return UTF8, UTF8, data.decode('utf-8')
+        except UnicodeDecodeError:
+            pass
+
+        # Each encoding is tried once, and the functions are only called if the previous ones failed
+        tried = {UTF8}
+        candidates = ((HEADER, lambda: self.from_header(content_type) if content_type else None),
+                      (META, lambda: self.from_meta(data)),
+                      (DETECTED, lambda: self.detect(data)))
+
+        for source, get_encoding in candidates:
+            encoding = get_encoding()
+
+            if encoding is None or encoding in tried:
+                continue
+
+            tried.add(encoding)
+
+            try:
+                return encoding, source, data.decode(encoding)
+            except (UnicodeError, LookupError):
+                # LookupError: codecs which are not text encodings (e.g. base64)
+                pass
+
+        for encoding in FALLBACK_ENCODINGS:
+            try:
+                return encoding, FALLBACK, data.decode(encoding)
+            except UnicodeDecodeError:
+                pass
+
+    def add(self, encoding, source):
+        self.counts[source] += 1
+        self.encoding_counts[encoding] = self.encoding_counts.get(encoding, 0) + 1
+
+    def log_counts(self):
+        total = sum(self.counts.values())
+
+        for source in SOURCES:
+            logging.info("Encoding from %s: %d documents (%.1f%%)", source, self.counts[source],
+                         self.counts[source] * 100 / total if total else 0.0)
+
+        for encoding, count in sorted(self.encoding_counts.items(), key=lambda item: -item[1]):
+            logging.info("Documents in %s: %d", encoding, count)
@@ -0,0 +1,315 @@
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# On-disk index of Murmur hashes (e.g. hashes of the plain text of the documents of previous crawls)
+#
+# File layout (little endian):
+#  - header: magic, number of hashes, size of each hash in bytes (4 or 8), number of hash functions
+#     of the bloom filter and log2 of the number of bits of the bloom filter
+#  - sorted and unique array of hashes (uint32 or uint64)
+#  - bloom filter
+#
+# The file is memory-mapped, so opening it is instant and nothing is loaded in memory: most of the queries
+#  of hashes which are not in the index are answered by the bloom filter, and the rest with a binary search
+
+import os
+import sys
+import mmap
+import fcntl
+import struct
+import logging
+import argparse
+import tempfile
+import itertools
+
+import numpy as np
+
+from monotextor.utils.common import open_xz_or_gzip_or_plain
+
+MAGIC = b"MTXHIDX1"
+HEADER = struct.Struct("<8sQBBxxI")
+HEADER_SIZE = 32
+DTYPES = {4: np.dtype("<u4"), 8: np.dtype("<u8")}
+BLOOM_MIX = 0x9E3779B97F4A7C15
+MASK64 = 0xFFFFFFFFFFFFFFFF
+CHUNK_SIZE = 1 << 22
+
+
+def is_hash_index(path):
+    if not os.path.isfile(path):
+        return False
+
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class HashIndex(object):
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.count, itemsize, self.bloom_hashes, bloom_bits_log2 = HEADER.unpack_from(self._mmap, 0)
+
+        if magic != MAGIC:
+            raise Exception(f"{path} is not a hash index")
+        if itemsize not in DTYPES:
+            raise Exception(f"{path}: unsupported hash size: {itemsize}")
+
+        self.dtype = DTYPES[itemsize]
+        self.hashes = np.frombuffer(self._mmap, dtype=self.dtype, count=self.count, offset=HEADER_SIZE)
+        self._bloom_offset = HEADER_SIZE + self.count * itemsize
+        self._bloom_mask = (1 << bloom_bits_log2) - 1
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, value):
+        if self.count == 0:
+            return False
+
+        # Bloom filter
+        mixed = (value * BLOOM_MIX) & MASK64
+        h1 = mixed & self._bloom_mask
+        h2 = (mixed >> 32) | 1
+
+        for i in range(self.bloom_hashes):
+            position = (h1 + i * h2) & self._bloom_mask
+
+            if not self._mmap[self._bloom_offset + (position >> 3)] & (1 << (position & 7)):
+                return False
+
+        # Binary search
+        idx = int(self.hashes.searchsorted(value))
+
+        return idx < self.count and int(self.hashes[idx]) == value
+
+    def chunks(self, chunk_size=CHUNK_SIZE):
+        # Copies, so the index can be closed even if the chunks are still referenced
+        for start in range(0, self.count, chunk_size):
+            yield np.array(self.hashes[start:start + chunk_size], dtype=np.uint64)
+
+    def close(self):
+        self.hashes = None
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def bloom_positions(values, bloom_hashes, bloom_mask):
+    values = values.astype(np.uint64)
+    mixed = values * np.uint64(BLOOM_MIX)
+    h1 = mixed & np.uint64(bloom_mask)
+    h2 = (mixed >> np.uint64(32)) | np.uint64(1)
+
+    for i in range(bloom_hashes):
+        yield (h1 + np.uint64(i) * h2) & np.uint64(bloom_mask)
+
+
+def merge_sorted_chunks(sources, chunk_size=CHUNK_SIZE):
+    # K-way merge of sorted arrays (or iterators of sorted chunks), removing duplicates, with bounded memory
+    iterators = [iter(source) for source in sources]
+    buffers = [np.empty(0, dtype=np.uint64) for _ in iterators]
+    last = None
+
+    while True:
+        for i, it in enumerate(iterators):
+            if it is not None and len(buffers[i]) == 0:
+                chunk = next(it, None)
+
+                if chunk is None:
+                    iterators[i] = None
+                else:
+                    buffers[i] = np.asarray(chunk, dtype=np.uint64)
+
+        alive = [i for i in range(len(buffers)) if len(buffers[i]) > 0]
+
+        if not alive:
+            break
+
+        # Everything up to the smallest of the last elements of the buffers can be safely merged
+        cutoff = min(buffers[i][-1] for i in alive)
+        parts = []
+
+        for i in alive:
+            idx = int(buffers[i].searchsorted(cutoff, side='right'))
+            parts.append(buffers[i][:idx])
+            buffers[i] = buffers[i][idx:]
+
+        merged = np.unique(np.concatenate(parts))
+
+        if last is not None and len(merged) > 0 and merged[0] == last:
+            merged = merged[1:]
+        if len(merged) > 0:
+            last = merged[-1]
+
+            for start in range(0, len(merged), chunk_size):
+                yield merged[start:start + chunk_size]
+
+
+def write_index(path, sorted_chunks, itemsize=4, bits_per_hash=10, bloom_hashes=6):
+    # sorted_chunks must be sorted and unique (e.g. the output of merge_sorted_chunks)
+    dtype = DTYPES[itemsize]
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    count = 0
+
+    with open(tmp_path, 'w+b') as f:
+        f.write(b"\0" * HEADER_SIZE)
+
+        for chunk in sorted_chunks:
+            f.write(np.asarray(chunk).astype(dtype).tobytes())
+            count += len(chunk)
+
+        bloom_bits_log2 = max(int(count * bits_per_hash - 1).bit_length(), 6)
+        bloom_mask = (1 << bloom_bits_log2) - 1
+        bloom = np.zeros(1 << (bloom_bits_log2 - 3), dtype=np.uint8)
+
+        f.flush()
+
+        if count:
+            hashes = np.memmap(f, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(count,))
+
+            for start in range(0, count, CHUNK_SIZE):
+                for positions in bloom_positions(hashes[start:start + CHUNK_SIZE], bloom_hashes, bloom_mask):
+                    np.bitwise_or.at(bloom, positions >> np.uint64(3),
+                                     np.left_shift(np.uint8(1), (positions & np.uint64(7)).astype(np.uint8)))
+
+            del hashes
+
+        f.seek(0, os.SEEK_END)
+        f.write(bloom.tobytes())
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, count, itemsize, bloom_hashes, bloom_bits_log2))
+
+    os.replace(tmp_path, path)
+
+    return count
+
+
+def read_index_chunks(path, chunk_size=CHUNK_SIZE):
+    with HashIndex(path) as index:
+        yield from index.chunks(chunk_size)
+
+
+def read_run_chunks(runs, start, count, chunk_size):
+    for offset in range(start, start + count, chunk_size):
+        yield np.array(runs[offset:min(offset + chunk_size, start + count)])
+
+
+def read_hashes_file(path, chunk_size=CHUNK_SIZE):
+    # Sources of merge_sorted_chunks with the hashes of a hash index or a file with a hash per line (i.e.
+    #  --output_hash of warc2preprocess). The lines are read in blocks of chunk_size hashes, and each block is
+    #  sorted and spilled to a temporary file, so only a block is held in memory
+    if is_hash_index(path):
+        return [read_index_chunks(path, chunk_size)]
+
+    runs_file = tempfile.TemporaryFile()
+    runs = []
+    start = 0
+
+    with open_xz_or_gzip_or_plain(path) as f:
+        hashes = (int(line) for line in f if not line.isspace())
+
+        while True:
+            chunk = np.unique(np.fromiter(itertools.islice(hashes, chunk_size), dtype=np.uint64))
+
+            if len(chunk) == 0:
+                break
+
+            runs_file.write(chunk.tobytes())
+            runs.append((start, len(chunk)))
+            start += len(chunk)
+
+    if not runs:
+        runs_file.close()
+        return []
+
+    runs_file.flush()
+    # The file is deleted when it is closed, and it is closed once the memory map is released
+    mapped = np.memmap(runs_file, dtype=np.uint64, mode='r', shape=(start,))
+    runs_file.close()
+    # The merge holds a chunk of each run
+    run_chunk_size = max(chunk_size // len(runs), 1 << 16)
+
+    return [read_run_chunks(mapped, run_start, count, run_chunk_size) for run_start, count in runs]
+
+
+def merge(output, inputs, hashes=None, itemsize=4, bits_per_hash=10, bloom_hashes=6):
+    sources = []
+
+    for path in inputs:
+        sources.extend(read_hashes_file(path))
+
+    if hashes is not None:
+        sources.append([np.unique(np.fromiter(hashes, dtype=np.uint64, count=len(hashes)))])
+
+    return write_index(output, merge_sorted_chunks(sources), itemsize=itemsize, bits_per_hash=bits_per_hash,
+                       bloom_hashes=bloom_hashes)
+
+
+def append(path, hashes, itemsize=4):
+    # Add new hashes to an index (it is created if it does not exist). The index is replaced by a new file, so
+    #  the jobs which share it are serialized with an exclusive lock of a lock file next to it: otherwise the
+    #  hashes of the job which replaced the index first would be lost
+    with open(f"{path}.lock", 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        try:
+            inputs = [path] if is_hash_index(path) else []
+
+            return merge(path, inputs, hashes=hashes, itemsize=itemsize)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Merge hash indexes and/or files with a Murmur hash per line "
+                                                 "(e.g. produced by parallel warc2preprocess jobs) in a single "
+                                                 "memory-mapped hash index",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('inputs', nargs='+',
+                        help="Hash indexes or files with a hash per line (plain, gz or xz)")
+    parser.add_argument('-o', '--output', required=True,
+                        help="Output hash index. It might be one of the inputs")
+    parser.add_argument('--hash-size', type=int, choices=sorted(DTYPES.keys()), default=4,
+                        help="Size of the hashes in bytes")
+    parser.add_argument('--bits-per-hash', type=int, default=10,
+                        help="Bits of the bloom filter per hash")
+    parser.add_argument('--bloom-hashes', type=int, default=6,
+                        help="Number of hash functions of the bloom filter")
+    parser.add_argument('--logging-level', type=int, default=logging.INFO,
+                        help="Logging level")
+
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    logging.basicConfig(level=args.logging_level)
+
+    count = merge(args.output, args.inputs, itemsize=args.hash_size, bits_per_hash=args.bits_per_hash,
+                  bloom_hashes=args.bloom_hashes)
+
+    logging.info("%d hashes were written to %s", count, args.output)
@@ -0,0 +1,256 @@
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Engines which extract the text of an HTML document (the --parser of warc2preprocess)
+#
+# Every engine implements extract(html), which returns the text or None if the document has to be ignored.
+#  The libraries are imported when the engine is created, so only the library of the selected engine is loaded
+
+import re
+import logging
+from html.parser import HTMLParser as HTMLTokenizer
+
+# Tags which are separated from the surrounding text by line breaks
+BLOCK_TAGS = frozenset([
+    "ul", "ol", "dl", "tr", "p", "div", "li", "dd", "dt", "th", "td", "h1", "h2", "h3", "h4", "h5", "h6", "article",
+    "aside", "blockquote", "details", "summary", "figcaption", "footer", "form", "header", "legend", "main", "nav",
+    "pre", "section"])
+# Tags replaced by a line break
+LINE_BREAK_TAGS = frozenset(["br", "hr"])
+# Tags whose content is not text
+NO_TEXT_TAGS = frozenset(["script", "noscript", "style"])
+
+OTHER_NODE, TEXT_NODE, BLOCK_NODE, LINE_BREAK_NODE = range(4)
+
+
+class SimpleParser(HTMLTokenizer):
+    startendNL = BLOCK_TAGS
+    selfNL = LINE_BREAK_TAGS
+    noText = NO_TEXT_TAGS
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.lastTok = ""
+        # The text is joined once at the end
+        self.parsed = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.startendNL or tag in self.selfNL:
+            self.parsed.append("\n")
+        self.lastTok = tag
+
+    def handle_endtag(self, tag):
+        if tag in self.startendNL:
+            self.parsed.append("\n")
+        else:
+            self.parsed.append(" ")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in self.selfNL:
+            self.parsed.append("\n")
+
+    def handle_data(self, data):
+        if self.lastTok not in self.noText:
+            newdata = data.replace("\r\n", " ").replace("\n", " ")
+            self.parsed.append(newdata)
+
+    def get_text(self):
+        return ''.join(self.parsed).strip() + "\n"
+
+
+class TextExtractor(object):
+    name = None
+
+    def extract(self, html):
+        raise NotImplementedError
+
+
+class LexborExtractor(TextExtractor):
+    # Single traversal of the lexbor tree (selectolax) once the no-text tags have been removed: block tags are
+    #  surrounded by line breaks and the pieces of text are joined once at the end
+    name = "lexbor"
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+
+        self.parser = LexborHTMLParser
+        self.no_text_tags = list(NO_TEXT_TAGS)
+
+    @staticmethod
+    def get_kind(tag):
+        if tag == "-text":
+            return TEXT_NODE
+        if tag in BLOCK_TAGS:
+            return BLOCK_NODE
+        if tag in LINE_BREAK_TAGS:
+            return LINE_BREAK_NODE
+        return OTHER_NODE
+
+    def extract(self, html):
+        tree = self.parser(html)
+        body = tree.body
+
+        if body is None:
+            logging.info("Body is empty. Ignoring this document")
+            return None
+
+        tree.strip_tags(self.no_text_tags, recursive=True)
+
+        parts = []
+        # The kind of node is stored by tag id (the ids of the unknown tags depend on the document)
+        kinds = {}
+        # Children still to visit of each open element, and whether it is a block tag (its end is a line break
+        #  even if it is the last child of an inline tag)
+        stack = [(body.iter(include_text=True), False)]
+
+        # Nodes are visited in document order
+        while stack:
+            children, is_block = stack[-1]
+            node = next(children, None)
+
+            if node is None:
+                stack.pop()
+
+                if is_block:
+                    parts.append("\n")
+
+                continue
+
+            tag_id = node.tag_id
+            kind = kinds.get(tag_id)
+
+            if kind is None:
+                kind = kinds[tag_id] = self.get_kind(node.tag)
+
+            if kind == TEXT_NODE:
+                # Line breaks of the source are not line breaks of the text
+                parts.append(node.text(deep=False).replace("\n", " "))
+            elif kind == BLOCK_NODE:
+                parts.append("\n")
+                stack.append((node.iter(include_text=True), True))
+            elif kind == LINE_BREAK_NODE:
+                parts.append("\n")
+            else:
+                stack.append((node.iter(include_text=True), False))
+
+        return ''.join(parts)
+
+
+class Bs4Extractor(TextExtractor):
+    name = "bs4"
+
+    def __init__(self):
+        from bs4 import BeautifulSoup
+
+        self.parser = BeautifulSoup
+
+    def extract(self, html):
+        try:
+            soup = self.parser(html, "lxml")
+        except Exception:
+            logging.info("Exception ocurred when processing the document with BeautifulSoup")
+            return None
+
+        for script in soup(["script", "style", "img"]):
+            script.extract()  # rip it out
+
+        return soup.get_text()
+
+
+class ModestExtractor(TextExtractor):
+    name = "modest"
+
+    def __init__(self):
+        from selectolax.parser import HTMLParser
+
+        self.parser = HTMLParser
+
+    def extract(self, html):
+        try:
+            tree = self.parser(html)
+        except BaseException:
+            logging.info("Tree structure issues in HTML/XML. Ignoring this document")
+            return None
+        for tag in tree.css('script'):
+            tag.decompose()
+        for tag in tree.css('style'):
+            tag.decompose()
+        for tag in tree.css('img'):
+            tag.decompose()
+        if tree.body is None:
+            logging.info("Body is empty. Ignoring this document")
+            return None
+        # TODO should separator='\n' be removed? It splits inline elements inside block elements...
+        return tree.body.text(separator='\n')
+
+
+class LxmlExtractor(TextExtractor):
+    # The document is expected to be fixed with html5lib
+    name = "lxml"
+
+    def __init__(self):
+        import lxml.html
+
+        self.document_fromstring = lxml.html.document_fromstring
+
+    def extract(self, html):
+        return self.document_fromstring(html).text_content()
+
+
+class SimpleExtractor(TextExtractor):
+    name = "simple"
+
+    def extract(self, html):
+        parser = SimpleParser()
+
+        try:
+            parser.feed(html)
+            return parser.get_text()
+        except BaseException:
+            logging.info("Tree structure issues in HTML/XML. Ignoring this document")
+            return None
+
+
+# Runs of spaces and line breaks (a single space or line break is already normalized)
+WHITESPACES_RE = re.compile(r"[ \n]{2,}")
+
+
+def normalize_whitespaces(match):
+    return '\n' if '\n' in match.group() else ' '
+
+
+def normalize_text(text):
+    # Whitespaces are collapsed and the lines are stripped (the same for every engine) in a single pass: a run of
+    #  whitespaces is replaced by a line break if it contains one, or by a space otherwise
+    #
+    # The result is the same as
+    #  re.sub(r"\n+", "\n", re.sub(r" *\n *", "\n", re.sub(r"[ \t\v\f]+", " ", re.sub(r"\r", "", text.replace('\xa0', ' '))))).strip()
+    #
+    # str.replace doesn't copy the text if the character is not found
+    text = text.replace('\xa0', ' ').replace('\t', ' ').replace('\v', ' ').replace('\f', ' ').replace('\r', '').strip()
+
+    return WHITESPACES_RE.sub(normalize_whitespaces, text)
+
+
+EXTRACTORS = {extractor.name: extractor
+              for extractor in (LexborExtractor, Bs4Extractor, ModestExtractor, LxmlExtractor, SimpleExtractor)}
+
+
+def get_extractor(name):
+    if name not in EXTRACTORS:
+        raise Exception(f"unknown text extraction engine: '{name}' (available: {', '.join(EXTRACTORS)})")
+
+    return EXTRACTORS[name]()
@@ -15,69 +15,96 @@
 
 import sys
 import shlex
-import base64
 import logging
 import argparse
-import contextlib
+import itertools
 import subprocess
+import multiprocessing
 
-def join(input_file='-', separator='\t', join_str='\t', is_plaintext=False, encode_errors='strict',
-         decode_errors='strict'):
-    if separator == '\n':
-        raise Exception(f"the provided separator is not valid: '{repr(separator)}'")
+from monotextor.utils.common import imap_ordered, batched
+from monotextor.utils.b64_docs import iter_lines, decode_doc, encode_doc, open_docs, DocWriter
 
-    cm = contextlib.nullcontext(sys.stdin)
-    columns = set()
+def join_doc(doc, separator, join_str, is_plaintext=False, encode_errors='strict', decode_errors='strict'):
+    # Returns the joined document (not encoded yet) and the number of segments (columns)
+    sentences_from_segments = []
+    nosentences = None
+
+    # Get all the sentences from all the segments of the document
+    for segment in doc.split(separator):
+        if not is_plaintext:
+            segment = decode_doc(segment)
+
+        segment = segment.decode('utf-8', errors=decode_errors)
 
-    if input_file != '-':
-        cm = open(input_file)
+        if segment[-1:] == '\n':
+            segment = segment[:-1]
 
-    with cm as doc_fd:
-        for idx, doc in enumerate(doc_fd):
-            try:
-                doc = doc.strip('\n').split(separator)
-                segments = []
-                text = []
+        sentences = segment.split('\n')
 
-                # Get all the segments from the current document
-                for segment in doc:
-                    if not is_plaintext:
-                        segment = base64.b64decode(segment).decode('utf-8', errors=decode_errors)
+        if nosentences is None:
+            nosentences = len(sentences)
+        elif nosentences != len(sentences):
+            raise Exception("same number of sentences were expected, but got different")
 
-                    segments.append(segment)
+        sentences_from_segments.append(sentences)
 
-                columns.add(len(segments))
-                nosentences = set()
-                sentences_from_segments = []
+    # The sentences of the segments are interleaved with the join string (or a line break after the last segment)
+    #  and the whole document is joined at once
+    interleaved = []
 
-                # Get all the sentences from all the segments
-                for segment in segments:
-                    if len(segment) > 0 and segment[-1] == '\n':
-                        segment = segment[:-1]
+    for sentences in sentences_from_segments:
+        interleaved.append(sentences)
+        interleaved.append(itertools.repeat(join_str))
 
-                    sentences = segment.split('\n')
+    interleaved[-1] = itertools.repeat('\n')
+    text = list(itertools.chain.from_iterable(zip(*interleaved)))
+    text.pop()
 
-                    sentences_from_segments.append(sentences)
-                    nosentences.add(len(sentences))
+    return ''.join(text).encode('utf-8', errors=encode_errors), len(sentences_from_segments)
 
-                if len(nosentences) not in (0, 1):
-                    raise Exception(f"document #{idx + 1}: same number of sentences were expected, but got different")
+def join_batch(task):
+    # Returns the BASE64-encoded documents of the batch, ready to be written, and the number of segments (columns)
+    docs, first_idx, separator, join_str, is_plaintext, encode_errors, decode_errors = task
+    encoded = []
+    columns = set()
 
-                # Join all the sentences from the segments for the current document
-                if len(nosentences) == 1:
-                    nosentences = nosentences.pop()
+    for idx, doc in enumerate(docs, first_idx):
+        try:
+            doc, nocolumns = join_doc(doc, separator, join_str, is_plaintext=is_plaintext, encode_errors=encode_errors,
+                                      decode_errors=decode_errors)
+        except Exception as e:
+            raise Exception(f"document #{idx + 1} could not be processed: {e}") from e
 
-                    for i in range(nosentences):
-                        current_sentence = join_str.join([sentences_from_segments[j][i] for j in range(len(sentences_from_segments))])
+        encoded.append(encode_doc(doc))
+        columns.add(nocolumns)
 
-                        text.append(current_sentence)
+    return b''.join(encoded), columns
 
-                doc = '\n'.join(text).encode('utf-8', errors=encode_errors)
-                doc = base64.b64encode(doc).decode('utf-8', errors=decode_errors)
+def join(input_file='-', separator='\t', join_str='\t', is_plaintext=False, encode_errors='strict',
+         decode_errors='strict', workers=1, batch_size=1000):
+    if separator == '\n':
+        raise Exception(f"the provided separator is not valid: '{repr(separator)}'")
 
-                print(doc)
-            except Exception as e:
-                raise Exception(f"document #{idx + 1} could not be processed") from e
+    columns = set()
+    separator = separator.encode('utf-8')
+
+    with open_docs(input_file) as doc_fd, DocWriter(sys.stdout.buffer) as writer:
+        # The lines are copied from the read blocks since they are sent to the workers
+        batches = batched(map(bytes, iter_lines(doc_fd)), batch_size)
+        tasks = ((docs, idx * batch_size, separator, join_str, is_plaintext, encode_errors, decode_errors)
+                 for idx, docs in enumerate(batches))
+
+        def write(results):
+            for encoded, batch_columns in results:
+                writer.write_line(encoded)
+                columns.update(batch_columns)
+
+        if workers > 1:
+            # Batches are processed in parallel, but written in the same order
+            with multiprocessing.Pool(workers) as pool:
+                write(imap_ordered(pool, join_batch, tasks, workers * 2))
+        else:
+            write(map(join_batch, tasks))
 
     if len(columns) not in (0, 1):
         logging.warning("different number of segments (columns) were processed: %s", columns)
@@ -98,11 +125,21 @@ def parse_args():
                         help="How encoding errors should be handled. Check 'errors' parameter from 'encode' method")
     parser.add_argument('--decode-errors', default='strict',
                         help="How decoding errors should be handled. Check 'errors' parameter from 'decode' method")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of batches of documents which are processed in parallel. The output keeps the "
+                             "order of the input")
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help="Number of documents which are processed at once")
     parser.add_argument('--logging-level', type=int, default=logging.INFO,
                         help="Logging level")
 
     args = parser.parse_args()
 
+    if args.workers < 1:
+        parser.error("--workers must be greater than 0")
+    if args.batch_size < 1:
+        parser.error("--batch-size must be greater than 0")
+
     return args
 
 if __name__ == '__main__':
@@ -111,4 +148,5 @@ if __name__ == '__main__':
     logging.basicConfig(level=args.logging_level)
 
     join(input_file=args.input, separator=args.separator, join_str=args.join_str, is_plaintext=args.input_is_not_base64,
-         encode_errors=args.encode_errors, decode_errors=args.decode_errors)
+         encode_errors=args.encode_errors, decode_errors=args.decode_errors, workers=args.workers,
+         batch_size=args.batch_size)
@@ -0,0 +1,126 @@
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Language identification of the documents of warc2preprocess (--langid)
+#
+# The language can be identified on a bounded sample of the document instead of the whole document: either the
+#  first characters or a few spans spread through it. The model is imported when the identifier is created
+
+import re
+
+MODELS = ("cld2", "cld3")
+
+# Start of the visible part of an HTML document
+BODY_RE = re.compile(r"<body[\s>]", re.IGNORECASE)
+# Content of the tags which is not text and the tags themselves (cld3 only works with plain text)
+NO_TEXT_RE = re.compile(r"<(script|style|noscript)\b.*?</\1\s*>|<!--.*?-->|<[^>]*>", re.IGNORECASE | re.DOTALL)
+SPACES_RE = re.compile(r"\s+")
+
+
+def remove_non_printable(text):
+    # Same result as ''.join(x for x in text if x.isprintable()), but the text is only copied for each distinct
+    #  non-printable character (a translation table is slower: str.translate looks up every character)
+    for c in set(text):
+        if not c.isprintable():
+            text = text.replace(c, '')
+
+    return text
+
+
+def sample_text(text, size, spans=1, is_html=False):
+    # Sample of about size characters: the first characters of the text or, if spans > 1, spans chunks evenly
+    #  spread through it. The chunks start after a space (or after the end of a tag in HTML documents, whose head
+    #  is skipped) so words and tags are not split at the beginning of the chunk
+    if not size:
+        return text
+
+    start = 0
+
+    if is_html:
+        match = BODY_RE.search(text)
+
+        if match:
+            start = match.start()
+
+    if len(text) - start <= size:
+        return text[start:] if start else text
+
+    boundary = '>' if is_html else ' '
+    chunk_size = size // max(spans, 1)
+    step = (len(text) - start - chunk_size) // max(spans - 1, 1)
+    chunks = []
+
+    for i in range(max(spans, 1)):
+        chunk_start = start + i * step
+        # The last of several chunks is the end of the text
+        chunk_end = len(text) if 0 < i == spans - 1 else chunk_start + chunk_size
+
+        if i:
+            aligned = text.find(boundary, chunk_start, chunk_end)
+
+            if aligned != -1:
+                chunk_start = aligned + 1
+
+        chunks.append(text[chunk_start:chunk_end])
+
+    return '\n'.join(chunks)
+
+
+def strip_tags(html):
+    return SPACES_RE.sub(' ', NO_TEXT_RE.sub(' ', html)).strip()
+
+
+class LanguageIdentifier(object):
+
+    def __init__(self, model="cld2", languages=(), banned=(), sample_size=0, sample_spans=1):
+        if model not in MODELS:
+            raise Exception(f"unknown language identification model: '{model}' (available: {', '.join(MODELS)})")
+
+        self.model = model
+        self.languages = frozenset(languages)
+        self.banned = frozenset(banned)
+        self.sample_size = sample_size
+        self.sample_spans = sample_spans
+
+        if model == "cld3":
+            import cld3
+
+            self.cld3_model = cld3.LanguageIdentifier()
+        else:
+            import pycld2
+
+            self.cld2 = pycld2
+
+    def is_restrictive(self):
+        # Whether some languages are discarded
+        return bool(self.languages or self.banned)
+
+    def accepts(self, lang):
+        return (not self.languages or lang in self.languages) and lang not in self.banned
+
+    def identify(self, text, is_html=False):
+        # Language code of the text ("un" if it could not be identified)
+        text = sample_text(text, self.sample_size, self.sample_spans, is_html=is_html)
+
+        if self.model == "cld2":
+            reliable, text_bytes, detected_languages = self.cld2.detect(remove_non_printable(text),
+                                                                        isPlainText=not is_html)
+            return detected_languages[0][1]
+
+        if is_html:
+            text = strip_tags(text)
+
+        language, probability, reliable, proportion = self.cld3_model.get_language(text)
+        return language
@@ -0,0 +1,109 @@
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# MIME type of the documents of warc2preprocess
+#
+# The cheapest source is used first: the Content-Type header of the record (if it is a textual type), then the
+#  signature of the beginning of the document and, only if both fail, libmagic with the whole document
+
+import re
+import logging
+
+HEADERS, PREFIX, LIBMAGIC = "headers", "prefix", "libmagic"
+SOURCES = (HEADERS, PREFIX, LIBMAGIC)
+
+# Textual types: the documents have been decoded as text, so other types in the headers are likely wrong (e.g.
+#  images served as HTML error pages)
+TEXT_MIME_RE = re.compile(r"^(text/[a-z0-9][a-z0-9!#$&^_.+-]*|[a-z]+/[a-z0-9!#$&^_.+-]*xml)$")
+# Signatures of the beginning of the document (lowercased and without leading whitespaces)
+PREFIX_SIGNATURES = (
+    ("<!doctype html", "text/html"),
+    ("<html", "text/html"),
+    ("<head", "text/html"),
+    ("<body", "text/html"),
+    ("<?xml", "text/xml"),
+    ("%pdf-", "application/pdf"),
+)
+PREFIX_SIZE = 64
+HEADER_CACHE_SIZE = 4096
+
+
+class MimeResolver(object):
+
+    def __init__(self, trust_headers=True, sniff_prefix=True):
+        self.trust_headers = trust_headers
+        self.sniff_prefix = sniff_prefix
+        # Content-Type header -> MIME type (None if the header can't be trusted)
+        self.header_cache = {}
+        self.counts = dict.fromkeys(SOURCES, 0)
+        self.magic = None
+
+    def from_header(self, content_type):
+        mime = self.header_cache.get(content_type, False)
+
+        if mime is False:
+            mime = content_type.split(';', 1)[0].strip().lower()
+
+            if not TEXT_MIME_RE.match(mime):
+                mime = None
+
+            if len(self.header_cache) < HEADER_CACHE_SIZE:
+                self.header_cache[content_type] = mime
+
+        return mime
+
+    @staticmethod
+    def from_prefix(text):
+        prefix = text[:PREFIX_SIZE].lstrip()[:PREFIX_SIZE].lower()
+
+        for signature, mime in PREFIX_SIGNATURES:
+            if prefix.startswith(signature):
+                return mime
+
+        return None
+
+    def from_libmagic(self, text):
+        if self.magic is None:
+            import magic
+
+            self.magic = magic
+
+        return self.magic.from_buffer(text, mime=True)
+
+    def resolve(self, text, content_type=None):
+        # MIME type and source of the MIME type
+        if self.trust_headers and content_type:
+            mime = self.from_header(content_type)
+
+            if mime:
+                return mime, HEADERS
+
+        if self.sniff_prefix:
+            mime = self.from_prefix(text)
+
+            if mime:
+                return mime, PREFIX
+
+        return self.from_libmagic(text), LIBMAGIC
+
+    def add(self, source):
+        self.counts[source] += 1
+
+    def log_counts(self):
+        total = sum(self.counts.values())
+
+        for source in SOURCES:
+            logging.info("MIME type from %s: %d documents (%.1f%%)", source, self.counts[source],
+                         self.counts[source] * 100 / total if total else 0.0)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Compare the boilerplate removal engines of warc2preprocess (--boilerplate-engine) on the HTML records of a WARC:
+#  startup time, throughput, memory and, if the reference engine (boilerpipe ArticleExtractor by default) is one
+#  of the engines, precision and recall of the words of the text which is kept with respect to the reference
+#
+# Each engine is run in its own process, so the memory (maximum RSS) and the startup of the JVM are not shared
+
+import os
+import sys
+import html
+import time
+import argparse
+import resource
+import collections
+import multiprocessing
+
+from monotextor.utils.boilerplate import REMOVERS, get_remover
+from monotextor.utils.html_extraction import get_extractor, normalize_text
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_html_extraction import DIR, read_documents
+
+
+def run(name, documents, batch_size, repeat):
+    start = time.time()
+    remover = get_remover(name)
+    startup = time.time() - start
+    extractor = get_extractor("lexbor")
+
+    start = time.time()
+
+    for _ in range(repeat):
+        deboiled = []
+
+        for i in range(0, len(documents), batch_size):
+            deboiled.extend(remover.remove(documents[i:i + batch_size]))
+
+    elapsed = (time.time() - start) / repeat
+    remover.close()
+
+    texts = []
+
+    for html in deboiled:
+        text = extractor.extract(html) if html is not None else None
+        texts.append(html.unescape(normalize_text(text)) if text is not None else None)
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    return startup, elapsed, max_rss, texts
+
+
+def run_in_process(args):
+    # Not run in the parent, so each engine starts from scratch
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(run, args)
+
+
+def compare(texts, reference_texts):
+    # Micro-averaged precision and recall of the bags of words of the texts
+    kept = 0
+    common = 0
+    reference = 0
+
+    for text, reference_text in zip(texts, reference_texts):
+        words = collections.Counter(text.split() if text else [])
+        reference_words = collections.Counter(reference_text.split() if reference_text else [])
+
+        kept += sum(words.values())
+        reference += sum(reference_words.values())
+        common += sum((words & reference_words).values())
+
+    precision = common / kept if kept else 0.0
+    recall = common / reference if reference else 0.0
+
+    return precision, recall
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark of the boilerplate removal engines of warc2preprocess",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('--warc', default=os.path.join(DIR, "html_sample.warc.gz"),
+                        help="WARC with the HTML documents")
+    parser.add_argument('--engines', nargs='+', default=list(REMOVERS), choices=list(REMOVERS),
+                        help="Engines which are compared")
+    parser.add_argument('--reference', default="boilerpipe", choices=list(REMOVERS),
+                        help="Engine whose text is the reference of the quality (only if it is one of --engines)")
+    parser.add_argument('--batch-size', type=int, default=32,
+                        help="Documents deboiled at once (--workers-batch-size of warc2preprocess)")
+    parser.add_argument('--limit', type=int,
+                        help="Maximum number of documents")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Times the documents are deboiled")
+
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    documents = read_documents(args.warc, args.limit)
+    results = {}
+
+    for name in args.engines:
+        results[name] = run_in_process((name, documents, args.batch_size, args.repeat))
+
+    for name in args.engines:
+        startup, elapsed, max_rss, texts = results[name]
+        failed = sum(text is None for text in texts)
+
+        print(f"{name}: startup {startup:.3f}s, {elapsed * 1000 / len(documents):.3f} ms/doc, max RSS "
+              f"{max_rss:.0f} MB, {failed} of {len(documents)} documents without text")
+
+        if args.reference in results and name != args.reference:
+            precision, recall = compare(texts, results[args.reference][3])
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+            print(f"  words with respect to {args.reference}: precision {precision:.3f}, recall {recall:.3f}, "
+                  f"F1 {f1:.3f}")
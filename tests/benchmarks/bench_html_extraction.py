@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Compare the text extraction engines of warc2preprocess (--parser) on the HTML records of a WARC: throughput
+#  and equivalence of the normalized text with the text of a reference engine (same text, same words ignoring
+#  the line breaks, and similarity of the words)
+#
+# The lxml engine is timed without the html5lib fix that warc2preprocess applies before it
+
+import os
+import sys
+import time
+import difflib
+import argparse
+
+from warcio.archiveiterator import ArchiveIterator
+
+from monotextor.utils.html_extraction import EXTRACTORS, get_extractor, normalize_text
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Line breaks of the lexbor engine around nested block tags: HTML and normalized text
+LINE_BREAK_CASES = [
+    ("<html><body><a><div>Title</div></a>More text</body></html>", "Title\nMore text"),
+    ("<html><body><div><span><p>a</p></span>b</div></body></html>", "a\nb"),
+    ("<html><body><div><span><b><p>a</p></b></span></div>b</body></html>", "a\nb"),
+    ("<html><body>a<span>b<br>c</span><li>d</li>e</body></html>", "ab\nc\nd\ne"),
+]
+
+
+def read_documents(path, limit=None):
+    documents = []
+
+    with open(path, 'rb') as f:
+        for record in ArchiveIterator(f):
+            if record.rec_type not in ('response', 'resource'):
+                continue
+
+            payload = record.content_stream().read()
+
+            try:
+                documents.append(payload.decode('utf-8'))
+            except UnicodeDecodeError:
+                documents.append(payload.decode('iso-8859-1'))
+
+            if limit and len(documents) >= limit:
+                break
+
+    return documents
+
+
+def check_line_breaks():
+    extractor = get_extractor("lexbor")
+    failed = 0
+
+    for html, expected in LINE_BREAK_CASES:
+        text = normalize_text(extractor.extract(html))
+
+        if text != expected:
+            print(f"ERROR: lexbor extracted {text!r} from {html!r} instead of {expected!r}", file=sys.stderr)
+            failed += 1
+
+    return failed == 0
+
+
+def run(extractor, documents):
+    texts = []
+
+    for document in documents:
+        text = extractor.extract(document)
+
+        texts.append(normalize_text(text) if text is not None else None)
+
+    return texts
+
+
+def compare(texts, reference_texts):
+    same_text = 0
+    same_words = 0
+    similarity = 0.0
+
+    for text, reference_text in zip(texts, reference_texts):
+        words = text.split() if text else []
+        reference_words = reference_text.split() if reference_text else []
+
+        same_text += text == reference_text
+        same_words += words == reference_words
+        similarity += difflib.SequenceMatcher(None, words, reference_words, autojunk=False).ratio() \
+            if words or reference_words else 1.0
+
+    return same_text, same_words, similarity / max(len(texts), 1)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark of the text extraction engines of warc2preprocess",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('--warc', default=os.path.join(DIR, "html_sample.warc.gz"),
+                        help="WARC with the HTML documents")
+    parser.add_argument('--engines', nargs='+', default=list(EXTRACTORS), choices=list(EXTRACTORS),
+                        help="Engines which are compared")
+    parser.add_argument('--reference', default="bs4", choices=list(EXTRACTORS),
+                        help="Engine whose text is used as reference")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="Times the documents are processed by each engine")
+    parser.add_argument('--limit', type=int,
+                        help="Maximum number of documents")
+    parser.add_argument('--check-only', action='store_true',
+                        help="Only check the line breaks of the lexbor engine around nested block tags")
+
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    if not check_line_breaks():
+        sys.exit(1)
+
+    if args.check_only:
+        print("OK: line breaks of the lexbor engine")
+        sys.exit(0)
+
+    documents = read_documents(args.warc, limit=args.limit)
+    size = sum(len(document.encode('utf-8')) for document in documents)
+    engines = args.engines if args.reference in args.engines else args.engines + [args.reference]
+    results = {}
+
+    if not documents:
+        print("ERROR: no documents were found", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"{len(documents)} documents ({size / 1024 / 1024:.2f} MB)")
+
+    for name in engines:
+        extractor = get_extractor(name)
+        start = time.time()
+
+        for _ in range(args.repeat):
+            results[name] = run(extractor, documents)
+
+        elapsed = (time.time() - start) / args.repeat
+
+        print(f"{name}: {elapsed * 1000 / len(documents):.3f} ms/doc ({len(documents) / elapsed:.0f} docs/s, "
+              f"{size / 1024 / 1024 / elapsed:.2f} MB/s)")
+
+    print(f"Equivalence with {args.reference}:")
+
+    for name in engines:
+        same_text, same_words, similarity = compare(results[name], results[args.reference])
+
+        print(f"{name}: {same_text} same text, {same_words} same words, {similarity:.3f} words similarity")
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Compare the language identification of the raw HTML documents of warc2preprocess (cld2) as it was done before
+#  (whole document filtered character by character) with the identification of the whole document and of
+#  samples of different sizes: throughput and documents whose language is the same
+
+import os
+import sys
+import time
+import argparse
+
+import pycld2
+
+from monotextor.utils.langid import LanguageIdentifier
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_html_extraction import DIR, read_documents
+
+
+def identify_chain(html):
+    reliable, text_bytes, detected_languages = pycld2.detect(
+        ''.join(x for x in html if x.isprintable()), isPlainText=False)
+    return detected_languages[0][1]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark of the language identification of warc2preprocess",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('--warc', default=os.path.join(DIR, "html_sample.warc.gz"),
+                        help="WARC with the HTML documents")
+    parser.add_argument('--sample-sizes', type=int, nargs='+', default=[0, 4096, 1024],
+                        help="Sizes of the samples (0 for the whole document)")
+    parser.add_argument('--sample-spans', type=int, default=3,
+                        help="Chunks of the samples")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="Times the documents are identified")
+
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    documents = read_documents(args.warc)
+    runs = [("before", identify_chain)]
+
+    for size in args.sample_sizes:
+        for spans in sorted({1, args.sample_spans} if size else {1}):
+            identifier = LanguageIdentifier("cld2", sample_size=size, sample_spans=spans)
+            runs.append((f"sample {size} chars, {spans} spans" if size else "whole document",
+                         lambda html, identifier=identifier: identifier.identify(html, is_html=True)))
+
+    expected = None
+
+    for label, func in runs:
+        start = time.time()
+
+        for _ in range(args.repeat):
+            langs = [func(document) for document in documents]
+
+        elapsed = (time.time() - start) / args.repeat
+
+        if expected is None:
+            expected = langs
+
+        same = sum(lang == expected_lang for lang, expected_lang in zip(langs, expected))
+
+        print(f"{label}: {elapsed * 1000 / len(documents):.3f} ms/doc, {same} of {len(documents)} documents with "
+              f"the same language")
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Compare the single regular expression which was applied to every line with the prefiltered scanner
+#  of monotextor_sensitive_data.py: the result must be the same for every line of the corpus
+
+import os
+import io
+import sys
+import time
+import argparse
+
+from monotextor.monotextor_sensitive_data import all_regex, scan, process
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_all_regex(lines):
+    output = io.StringIO()
+
+    for line in lines:
+        line_strip = line.rstrip()
+        match = all_regex.search(line_strip.split('\t')[1])
+
+        print(line_strip, 'no' if match is None else 'yes', sep='\t', file=output)
+
+    return output.getvalue()
+
+
+def run_scanner(lines):
+    output = io.StringIO()
+
+    process(lines, output)
+
+    return output.getvalue()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark of the sensitive data scanner",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('--corpus', default=os.path.join(DIR, "sensitive_data.tsv"),
+                        help="Tab-separated corpus (the text is expected in the second column)")
+    parser.add_argument('--repeat', type=int, default=250,
+                        help="Times the corpus is processed")
+
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    with open(args.corpus) as f:
+        lines = f.readlines() * args.repeat
+
+    results = {}
+
+    for name, func in (("all_regex", run_all_regex), ("scanner", run_scanner)):
+        start = time.time()
+        results[name] = func(lines)
+        elapsed = time.time() - start
+
+        print(f"{name}: {len(lines)} lines in {elapsed:.2f}s ({len(lines) / elapsed:.0f} lines/s)")
+
+    if results["all_regex"] != results["scanner"]:
+        print("ERROR: different results", file=sys.stderr)
+        sys.exit(1)
+
+    matched = sum(1 for line in set(lines) if scan(line.split('\t')[1]))
+
+    print(f"OK: same results ({matched} of {len(set(lines))} unique lines contain sensitive data)")
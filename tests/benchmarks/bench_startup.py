@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Startup time of the preprocessing scripts, which are started once per WARC: each script is run with an empty
+#  WARC and its default options under 'python -X importtime', and the slowest imports are reported
+#
+# The exit status is 1 if a script imports a module which is only needed by non-default options (or the startup
+#  is slower than --max-seconds), so it can be used to catch startup regressions
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(os.path.dirname(DIR))
+
+# Script, arguments and modules which must not be imported with the default options
+SCRIPTS = {
+    "warc2preprocess": ("monotextor/bitextor_warc2preprocess.py", ["--input", "-", "--output-dir", "{tmp}"],
+                        ["html5lib", "lxml.etree", "bs4", "multiprocessing.pool", "psutil", "jpype", "cld3",
+                         "cchardet"]),
+    "warc2htmlwarc": ("monotextor/bitextor_warc2htmlwarc.py", ["--output", os.devnull],
+                      ["lxml.html.clean", "ftfy", "jpype", "pdfextract", "psutil", "cchardet"]),
+}
+
+
+def run(script, arguments, tmp):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([ROOT] + ([env["PYTHONPATH"]] if "PYTHONPATH" in env else []))
+    command = [sys.executable, "-X", "importtime", os.path.join(ROOT, script)] \
+        + [argument.format(tmp=tmp) for argument in arguments]
+
+    start = time.time()
+    result = subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            env=env, check=False)
+    elapsed = time.time() - start
+
+    if result.returncode != 0:
+        raise Exception(f"{script} failed: {result.stderr.decode('utf-8', errors='replace')[-1000:]}")
+
+    # import time: self [us] | cumulative | imported package
+    imports = {}
+
+    for line in result.stderr.decode('utf-8', errors='replace').splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+
+        self_time, cumulative, name = line[len("import time:"):].split('|')
+        level = (len(name) - len(name.lstrip())) // 2
+        imports[name.strip()] = (int(cumulative), level)
+
+    return elapsed, imports
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark of the startup time of the preprocessing scripts",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('--scripts', nargs='+', default=list(SCRIPTS), choices=list(SCRIPTS),
+                        help="Scripts which are started")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="Times each script is started (the median is reported)")
+    parser.add_argument('--top', type=int, default=10,
+                        help="Number of slowest top-level imports which are reported")
+    parser.add_argument('--max-seconds', type=float,
+                        help="Maximum median startup time of each script")
+
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    ok = True
+
+    for name in args.scripts:
+        script, arguments, forbidden = SCRIPTS[name]
+        elapsed = []
+
+        for _ in range(args.repeat):
+            with tempfile.TemporaryDirectory() as tmp:
+                seconds, imports = run(script, arguments, tmp)
+                elapsed.append(seconds)
+
+        median = sorted(elapsed)[len(elapsed) // 2]
+        top_level = sorted(((cumulative, module) for module, (cumulative, level) in imports.items() if level == 1),
+                           reverse=True)
+        unexpected = [module for module in forbidden if module in imports]
+
+        print(f"{name}: {median:.3f}s, {len(imports)} modules")
+
+        for cumulative, module in top_level[:args.top]:
+            print(f"  {cumulative / 1000:8.1f} ms  {module}")
+
+        if unexpected:
+            print(f"ERROR: {name} imports modules which are not needed with the default options: "
+                  f"{', '.join(unexpected)}", file=sys.stderr)
+            ok = False
+
+        if args.max_seconds and median > args.max_seconds:
+            print(f"ERROR: {name} startup ({median:.3f}s) is slower than {args.max_seconds}s", file=sys.stderr)
+            ok = False
+
+    if not ok:
+        sys.exit(1)
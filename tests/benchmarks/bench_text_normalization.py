@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Compare the chain of regular expressions which normalized the extracted text of warc2preprocess with the single
+#  pass of normalize_text: the result must be the same for the texts extracted from a WARC and for random texts
+#  full of whitespaces
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+from monotextor.utils.html_extraction import get_extractor, normalize_text
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_html_extraction import DIR, read_documents
+
+RANDOM_ALPHABET = [" ", "  ", "\t", "\n", "\r", "\r\n", "\xa0", "\v", "\f", "\x85", " ", "a", "bc", "&amp;",
+                   "&#10;", "&#32;", "&nbsp", "&not;", "&#x26;", "& ", "&"]
+
+
+def normalize_chain(text):
+    return re.sub(r"\n+", "\n",
+                  re.sub(r" *\n *", "\n",
+                         re.sub(r"[ \t\v\f]+", " ",
+                                re.sub(r"\r", "",
+                                       text.replace(u'\xa0', u' '))))).strip()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark of the text normalization of warc2preprocess",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('--warc', default=os.path.join(DIR, "html_sample.warc.gz"),
+                        help="WARC with the HTML documents whose text is normalized")
+    parser.add_argument('--engine', default="lexbor",
+                        help="Engine which extracts the text")
+    parser.add_argument('--random-texts', type=int, default=500,
+                        help="Number of random texts which are added to the texts of the WARC")
+    parser.add_argument('--repeat', type=int, default=10,
+                        help="Times the texts are normalized")
+
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    extractor = get_extractor(args.engine)
+    rng = random.Random(1)
+    texts = {
+        "warc": [text for text in map(extractor.extract, read_documents(args.warc)) if text is not None],
+        "random": [''.join(rng.choice(RANDOM_ALPHABET) for _ in range(rng.randint(0, 2000)))
+                   for _ in range(args.random_texts)],
+    }
+    ok = True
+
+    for texts_name, current_texts in texts.items():
+        elapsed = {}
+        size = sum(len(text) for text in current_texts) / 1000000
+
+        for label, f in (("chain", normalize_chain), ("single pass", normalize_text)):
+            start = time.time()
+
+            for _ in range(args.repeat):
+                results = [f(text) for text in current_texts]
+
+            elapsed[label] = (time.time() - start) / args.repeat
+
+            if label == "chain":
+                expected = results
+
+        same = sum(result == expected_result for result, expected_result in zip(results, expected))
+
+        print(f"normalization ({texts_name} texts): chain {elapsed['chain']:.3f}s, single pass "
+              f"{elapsed['single pass']:.3f}s ({size / elapsed['single pass']:.1f} M chars/s, "
+              f"{elapsed['chain'] / elapsed['single pass']:.1f}x), {same} of {len(current_texts)} texts are "
+              f"the same")
+
+        ok = ok and same == len(current_texts)
+
+    if not ok:
+        print("ERROR: different results", file=sys.stderr)
+        sys.exit(1)
+
+    print("OK: same results")
@@ -163,6 +163,22 @@ tests-others()
 
         finish_test "en fr" "sent.gz"
     ) &
+    ## Startup of the preprocessing scripts (no unneeded imports with the default options)
+    (
+        init_test "101"
+
+        python3 ${DIR}/benchmarks/bench_startup.py --repeat 1 &> "${WORK}/reports/${TEST_ID}.report"
+
+        annotate_and_echo_info "${TEST_ID}" "$?" "$(cat ${WORK}/reports/${TEST_ID}.report | wc -l)"
+    ) &
+    ## Line breaks of the lexbor text extraction engine around nested block tags
+    (
+        init_test "102"
+
+        python3 ${DIR}/benchmarks/bench_html_extraction.py --check-only &> "${WORK}/reports/${TEST_ID}.report"
+
+        annotate_and_echo_info "${TEST_ID}" "$?" "$(cat ${WORK}/reports/${TEST_ID}.report | wc -l)"
+    ) &
 }
 
 run-tests()